@@ -0,0 +1,66 @@
+"""
+ns per pack, unpack (through a Buffer) and unpack_from call for each datatype
+
+    python benchmarks/datatypes.py
+"""
+
+import sys
+import timeit
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from proxhy.datatypes import (  # noqa: E402
+    UUID,
+    Boolean,
+    Buffer,
+    ByteArray,
+    Chat,
+    Long,
+    Short,
+    String,
+    UnsignedByte,
+    UnsignedShort,
+    VarInt,
+)
+
+NUMBER = 100_000
+
+CASES = [
+    ("VarInt 1 B", VarInt, 5),
+    ("VarInt 2 B", VarInt, 300),
+    ("VarInt 3 B", VarInt, 2**20),
+    ("VarInt 5 B (-1)", VarInt, -1),
+    ("String", String, "hello"),
+    ("String, multibyte", String, "∎ ünïcødé"),
+    ("UnsignedShort", UnsignedShort, 25565),
+    ("Short", Short, -1),
+    ("Long", Long, 2**40),
+    ("UnsignedByte", UnsignedByte, 255),
+    ("ByteArray", ByteArray, bytes(64)),
+    ("Chat", Chat, "hello"),
+    ("UUID", UUID, uuid.UUID(int=2**127)),
+    ("Boolean", Boolean, True),
+]
+
+
+def ns(func) -> float:
+    return min(timeit.repeat(func, number=NUMBER, repeat=5)) / NUMBER * 1e9
+
+
+def main():
+    print(f"{'':20}{'pack':>10}{'unpack':>10}{'unpack_from':>14}")
+    for name, kind, value in CASES:
+        packed = kind.pack(value)
+        view = memoryview(packed)
+        times = (
+            ns(lambda: kind.pack(value)),
+            ns(lambda: kind.unpack(Buffer(packed))),
+            ns(lambda: kind.unpack_from(view)),
+        )
+        print(f"{name:20}{times[0]:>10.0f}{times[1]:>10.0f}{times[2]:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
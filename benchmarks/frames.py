@@ -0,0 +1,59 @@
+"""
+frames/s Stream.read_frame decodes from an in-memory reader, in plaintext
+and with AES-CFB8, for 50k frames of mixed sizes
+
+    python benchmarks/frames.py
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cryptography.hazmat.primitives.ciphers import Cipher  # noqa: E402
+from cryptography.hazmat.primitives.ciphers.algorithms import AES  # noqa: E402
+from cryptography.hazmat.primitives.ciphers.modes import CFB8  # noqa: E402
+
+from proxhy.datatypes import VarInt  # noqa: E402
+from proxhy.encryption import Stream  # noqa: E402
+
+FRAMES = 50_000
+SIZES = [5, 12, 40, 300, 3000]
+
+
+async def decode(wire: bytes, key: bytes | None) -> float:
+    reader = asyncio.StreamReader()
+    reader.feed_data(wire)
+    reader.feed_eof()
+    stream = Stream(reader, None)
+    if key is not None:
+        stream.key = key
+
+    frames = 0
+    start = time.perf_counter()
+    while await stream.read_frame():
+        frames += 1
+    elapsed = time.perf_counter() - start
+
+    assert frames == FRAMES
+    return frames / elapsed
+
+
+def main():
+    random.seed(0)
+    frames = [os.urandom(random.choice(SIZES)) for _ in range(FRAMES)]
+    wire = b"".join(VarInt.pack(len(frame)) + frame for frame in frames)
+
+    key = os.urandom(16)
+    encrypted = Cipher(AES(key), CFB8(key)).encryptor().update(wire)
+
+    print(f"plaintext: {asyncio.run(decode(wire, None)):>10,.0f} frames/s")
+    print(f"AES-CFB8:  {asyncio.run(decode(encrypted, key)):>10,.0f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+packets/s Client.send_packet queues and flushes to a local socket, plain and
+on a compressed and encrypted leg, and ns per VarInt.pack, which packs the
+id and lengths of every packet sent
+
+    python benchmarks/send_packet.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from proxhy.client import Client  # noqa: E402
+from proxhy.datatypes import VarInt  # noqa: E402
+from proxhy.encryption import Stream  # noqa: E402
+
+CASES = [
+    # payload size, compression, aes
+    (40, False, False),
+    (3000, False, False),
+    (40, True, False),
+    (40, True, True),
+    (3000, True, True),
+]
+
+
+async def send(size: int, compression: bool, aes: bool, seconds=1.0) -> float:
+    async def sink(reader, writer):
+        while await reader.read(2**20):
+            pass
+        writer.close()
+
+    # not a socketpair: the client sets tcp options on its leg
+    server = await asyncio.start_server(sink, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    # a client whose own leg is never read from or written to
+    client = Client(*await asyncio.open_connection("127.0.0.1", port))
+    _, writer = await asyncio.open_connection("127.0.0.1", port)
+    stream = client.server_stream = Stream(None, writer)
+    if aes:
+        stream.key = os.urandom(16)
+    client.compression = compression
+    client.compression_threshold = 256
+
+    payload = os.urandom(size)
+    packets = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for _ in range(200):
+            client.send_packet(stream, 0x21, b"\x01\x02", payload)
+        packets += 200
+        stream.flush()
+        await writer.drain()
+    elapsed = time.perf_counter() - start
+
+    await client.close()  # and the stream to the sink
+    server.close()
+    await server.wait_closed()
+    return packets / elapsed
+
+
+def main():
+    for size, compression, aes in CASES:
+        rate = asyncio.run(send(size, compression, aes))
+        print(
+            f"{size:>5} B, compression={compression!s:<5} aes={aes!s:<5}"
+            f"{rate:>12,.0f} packets/s"
+        )
+
+    print()
+    for value in 5, 300, 2**20, -1:
+        ns = min(timeit.repeat(lambda: VarInt.pack(value), number=200_000)) / 200_000
+        print(f"VarInt.pack({value}):".ljust(24) + f"{ns * 1e9:>6.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,167 @@
+import argparse
 import asyncio
+import multiprocessing
+import socket
 import sys
 from asyncio import StreamReader, StreamWriter
 
+from . import transport
+from .api import load_keys
 from .auth import load_auth_info
+from .client import features
+from .filters import load_rules
+from .http_pool import http_pool
 from .proxy import ProxyClient
+from .stats_cache import player_cache, stats_cache
 
 
 async def handle_client(reader: StreamReader, writer: StreamWriter):
     ProxyClient(reader, writer)
 
 
-async def start():
+async def start(
+    buffered: bool = False,
+    compress_client: bool = False,
+    feature_thread: bool = False,
+    disabled_features: set[str] = frozenset(),
+    reuse_port: bool = False,
+):
     await load_auth_info()
-    server = await asyncio.start_server(handle_client, "localhost", 13876)
+    ProxyClient.compress_client = compress_client
+    ProxyClient.feature_thread = feature_thread
+    ProxyClient.disabled_features = set(disabled_features)
+    start_server = transport.start_server if buffered else asyncio.start_server
+    server = await start_server(
+        handle_client, "localhost", 13876, reuse_port=reuse_port or None
+    )
 
     print("Started proxhy!")
-    async with server:
-        await server.serve_forever()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await http_pool.close()
+        # not left to atexit, which forked workers exit without running
+        stats_cache.flush()
+
+
+async def login():
+    try:
+        await load_auth_info()
+    finally:
+        # its sessions belong to this loop, which is gone before the fork
+        await http_pool.close()
+
+
+def worker(**options):
+    try:
+        asyncio.run(start(reuse_port=True, **options))
+    except KeyboardInterrupt:
+        pass
+
+
+def start_workers(workers: int, **options):
+    """
+    run the proxy in this many processes, each with its own loop and its own
+    socket on the same port; the kernel spreads new connections between them.
+    the module globals (the feature loop, offloader, filter rules, http pool,
+    api scheduler and stats caches) are shared by every connection in a
+    process, and each worker gets its own copy of them in the fork
+    """
+    # log in (and ask for credentials) once, forked workers inherit the result
+    asyncio.run(login())
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=worker, kwargs=options, daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
 
 
 def main():
+    parser = argparse.ArgumentParser(prog="proxhy")
+    parser.add_argument(
+        "--buffered",
+        action="store_true",
+        help="use the BufferedProtocol transport for both proxy legs",
+    )
+    parser.add_argument(
+        "--compress-client",
+        action="store_true",
+        help="compress the client leg too and pass compressed packets through",
+    )
+    parser.add_argument(
+        "--feature-thread",
+        action="store_true",
+        help="run listeners on a second thread, leaving the loop to relay packets",
+    )
+    parser.add_argument(
+        "--without",
+        action="append",
+        default=[],
+        choices=sorted(features),
+        metavar="FEATURE",
+        help=f"start connections with this feature turned off (one of "
+        f"{', '.join(sorted(features))}). /feature turns it back on, except "
+        "for commands, since /feature is a command itself",
+    )
+    parser.add_argument(
+        "--filters",
+        help="json file of rules for dropping or rate limiting packets from the "
+        "server (default: filters.json in the config directory, if it exists)",
+    )
+    parser.add_argument(
+        "--api-keys",
+        help="file of more hypixel api keys, one per line, to spread lookups "
+        "across (default: api_keys in the config directory, if it exists)",
+    )
+    parser.add_argument(
+        "--stats-ttl",
+        action="append",
+        default=[],
+        metavar="MODE=MINUTES",
+        help="how long cached player stats are used for in a gamemode (default: "
+        f"{player_cache.default_ttl // 60}, "
+        + ", ".join(f"{mode} {ttl // 60}" for mode, ttl in player_cache.ttl.items())
+        + ")",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes sharing the port (needs SO_REUSEPORT)",
+    )
+    args = parser.parse_args()
+    if args.workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        parser.error("--workers needs SO_REUSEPORT, which this platform doesn't have")
+    try:
+        # loaded once here, forked workers inherit them
+        load_rules(args.filters)
+        load_keys(args.api_keys)
+    except ValueError as e:
+        parser.error(str(e))
+    for entry in args.stats_ttl:
+        mode, _, minutes = entry.partition("=")
+        try:
+            player_cache.ttl[mode.lower()] = float(minutes) * 60
+        except ValueError:
+            parser.error(f"--stats-ttl wants MODE=MINUTES, not {entry!r}")
+
+    options = {
+        "buffered": args.buffered,
+        "compress_client": args.compress_client,
+        "feature_thread": args.feature_thread,
+        "disabled_features": set(args.without),
+    }
     try:
-        asyncio.run(start())
+        if args.workers > 1:
+            start_workers(args.workers, **options)
+        else:
+            asyncio.run(start(**options))
     except KeyboardInterrupt:
         sys.exit()
 
@@ -0,0 +1,306 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from collections import Counter
+from pathlib import Path
+
+import aiohttp
+import hypixel
+from appdirs import user_config_dir
+
+from .http_pool import http_pool
+
+# priorities of hypixel requests, lowest first
+INTERACTIVE = 0  # asked for by the player, like /sc
+BACKGROUND = 1  # tab stats and refreshes
+# the priority of requests made in this context
+api_priority = contextvars.ContextVar("api_priority", default=BACKGROUND)
+
+
+class Quota:
+    """
+    the requests one key has left this window, as of the api's last
+    RateLimit-* headers, less the requests made since
+    """
+
+    def __init__(self, limit: int = 300, window: float = 300.0):
+        # hypixel's usual limit, until a response says otherwise
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.resets_at = time.monotonic() + window
+        self.in_flight = 0
+
+    def wait(self) -> float:
+        """seconds until a request can be made, 0 if one can now"""
+        now = time.monotonic()
+        if now >= self.resets_at:
+            self.remaining = self.limit
+            self.resets_at = now + self.window
+        if self.remaining > 0:
+            return 0.0
+        return self.resets_at - now
+
+    def take(self):
+        self.remaining -= 1
+        self.in_flight += 1
+
+    def update(self, headers):
+        """count a request done, with the limit from its response headers"""
+        self.in_flight -= 1
+        try:
+            limit = int(headers["RateLimit-Limit"])
+            remaining = int(headers["RateLimit-Remaining"])
+            reset = int(headers["RateLimit-Reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        self.limit = limit
+        # requests still in flight weren't counted in this response yet
+        self.remaining = max(remaining - self.in_flight, 0)
+        self.resets_at = time.monotonic() + reset
+
+    def exhausted(self, retry_after: float):
+        self.remaining = 0
+        self.resets_at = time.monotonic() + retry_after
+
+
+class ApiScheduler:
+    """
+    every hypixel request in the process waits here for its turn and a key
+    from the pool: at most concurrency_per_key are made at once for each
+    usable key, none past their key's quota, and waiting requests go in
+    priority order, then in the order they came. each request gets the
+    least loaded key, and keys the api calls invalid are set aside
+    """
+
+    concurrency_per_key = 4
+    # seconds a key the api called invalid isn't used for
+    quarantine_seconds = 60 * 60
+
+    def __init__(self):
+        self.quotas: dict[str, Quota] = {}  # the pool
+        self.quarantined: dict[str, float] = {}  # key -> monotonic time until
+        self.active = 0
+        # (priority, order, future set to the key when it's this request's turn)
+        self._waiting: list[tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._wakeup: asyncio.TimerHandle | None = None
+
+        # priority -> requests, seconds waited
+        self.requests: Counter[int] = Counter()
+        self.seconds: Counter[int] = Counter()
+        # key -> requests, rate limited requests
+        self.key_requests: Counter[str] = Counter()
+        self.key_rate_limited: Counter[str] = Counter()
+
+    def add_keys(self, keys):
+        for key in keys:
+            if key and key not in self.quotas:
+                self.quotas[key] = Quota()
+
+    def _usable(self) -> list[str]:
+        now = time.monotonic()
+        for key, until in list(self.quarantined.items()):
+            if now >= until:
+                del self.quarantined[key]
+        usable = [key for key in self.quotas if key not in self.quarantined]
+        # with every key set aside, requests go anyway and fail as before
+        return usable or list(self.quotas)
+
+    @property
+    def concurrency(self) -> int:
+        return self.concurrency_per_key * max(len(self._usable()), 1)
+
+    def _pick(self) -> tuple[str | None, float]:
+        """the least loaded key with quota left, or the seconds until one has"""
+        keys = self._usable()
+        waits = {key: self.quotas[key].wait() for key in keys}
+        ready = [key for key in keys if not waits[key]]
+        if ready:
+            key = max(
+                ready,
+                key=lambda key: (
+                    self.quotas[key].remaining,
+                    -self.quotas[key].in_flight,
+                ),
+            )
+            return key, 0.0
+        return None, min(waits.values(), default=0.0)
+
+    async def acquire(self) -> str | None:
+        """wait for a turn to make a request; returns its key. release() after"""
+        priority = api_priority.get()
+        self.requests[priority] += 1
+        if not self._waiting and self.active < self.concurrency:
+            key, wait = self._pick()
+            if not wait:
+                self._start(key)
+                return key
+
+        started = time.perf_counter()
+        turn = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._order), turn))
+        self._next()
+        try:
+            return await turn
+        except asyncio.CancelledError:
+            if turn.done() and not turn.cancelled():
+                self.release(turn.result())  # given a turn, but gone before it
+            raise
+        finally:
+            self.seconds[priority] += time.perf_counter() - started
+
+    def _start(self, key: str | None):
+        self.active += 1
+        if key is not None:
+            self.quotas[key].take()
+            self.key_requests[key] += 1
+
+    def release(self, key: str | None, headers=None):
+        self.active -= 1
+        if key is not None:
+            self.quotas[key].update(headers or {})
+        self._next()
+
+    def limited(self, key: str | None, headers):
+        """the api said the key is over its limit after all"""
+        if key is None:
+            return
+        self.key_rate_limited[key] += 1
+        try:
+            retry_after = int(headers["Retry-After"]) + 1
+        except (KeyError, TypeError, ValueError):
+            retry_after = self.quotas[key].window
+        self.quotas[key].exhausted(retry_after)
+
+    def invalid(self, key: str | None) -> bool:
+        """set the key aside; returns whether there's another to try"""
+        if key is None:
+            return False
+        if key not in self.quarantined:
+            print(f"Hypixel API key {_masked(key)} is invalid, not using it for now")
+        self.quarantined[key] = time.monotonic() + self.quarantine_seconds
+        return any(key not in self.quarantined for key in self.quotas)
+
+    def _next(self):
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+
+        while self._waiting and self.active < self.concurrency:
+            _priority, _order, turn = self._waiting[0]
+            if turn.done():  # its caller was cancelled
+                heapq.heappop(self._waiting)
+                continue
+            key, wait = self._pick()
+            if wait:
+                # the next request has to wait for a key's window to reset
+                self._wakeup = asyncio.get_running_loop().call_later(
+                    wait, self._next
+                )
+                return
+            heapq.heappop(self._waiting)
+            self._start(key)
+            turn.set_result(key)
+
+    def stats(self) -> dict[str, int | float | str]:
+        stats = {
+            "active": self.active,
+            "waiting": len(self._waiting),
+            "rate limited": sum(self.key_rate_limited.values()),
+        }
+        for priority, name in (INTERACTIVE, "interactive"), (BACKGROUND, "background"):
+            stats[f"{name} requests"] = self.requests[priority]
+            if self.requests[priority]:
+                mean = self.seconds[priority] / self.requests[priority]
+                stats[f"{name} mean ms waited"] = round(mean * 1000, 2)
+        for key, quota in self.quotas.items():
+            quota.wait()  # in case its window reset
+            usage = (
+                f"{self.key_requests[key]} requests, {quota.remaining}/{quota.limit} "
+                f"left, {self.key_rate_limited[key]} rate limited"
+            )
+            if key in self.quarantined:
+                usage += ", invalid"
+            stats[f"key {_masked(key)}"] = usage
+        return stats
+
+
+def _masked(key: str) -> str:
+    return f"…{key[-6:]}"
+
+
+def load_keys(path: Path | str | None = None) -> list[str]:
+    """
+    add keys to the pool from a file with one per line (# for comments),
+    from path or api_keys in the config directory if there is one
+    """
+    if path is None:
+        path = Path(user_config_dir("proxhy")) / "api_keys"
+        if not path.exists():
+            return list(api_scheduler.quotas)
+
+    try:
+        with open(path) as file:
+            lines = file.read().splitlines()
+    except OSError as e:
+        raise ValueError(f"can't read api keys from {path}: {e}")
+
+    api_scheduler.add_keys(
+        key for line in lines if (key := line.split("#", 1)[0].strip())
+    )
+    return list(api_scheduler.quotas)
+
+
+class HypixelClient(hypixel.Client):
+    """
+    hypixel.Client, with its requests made through api_scheduler, which
+    picks the key from the pool its keys are added to. a request that's
+    rate limited anyway waits for the window to reset and goes again, and
+    one with an invalid key goes again with another key if there is one.
+    requests are made with http_pool's session for the loop they're on
+    """
+
+    def __init__(self, keys=None, **options):
+        super().__init__(keys, **options)
+        api_scheduler.add_keys(self._keys or ())
+
+    @property
+    def _session(self) -> aiohttp.ClientSession:
+        return http_pool.session()
+
+    @_session.setter
+    def _session(self, session: aiohttp.ClientSession):
+        # hypixel.py makes its own, which is never used (or connected)
+        session.detach()
+
+    async def close(self):
+        pass  # the session is the pool's, and outlives the connection
+
+    async def _get_helper(self, path, params):
+        while True:
+            key = await api_scheduler.acquire()
+            if key is not None:
+                params["key"] = key  # _get reads it back for InvalidApiKey
+            headers = None
+            try:
+                response = await super()._get_helper(path, params)
+                headers = response.headers
+                if response.status == 429:
+                    api_scheduler.limited(key, headers)
+            finally:
+                api_scheduler.release(key, headers)
+
+            if response.status == 403 and api_scheduler.invalid(key):
+                response.release()
+            elif response.status == 429:
+                response.release()
+            else:
+                return response
+
+
+# only used on the loop handlers run on, since the turns it hands out are
+# futures there
+api_scheduler = ApiScheduler()
@@ -11,8 +11,18 @@ from appdirs import user_cache_dir
 from .msmcauthaio import MsMcAuth, UserProfile
 
 
+# credentials are read once per process (and inherited by forked workers)
+# instead of reading and rewriting the cache file on every login
+_auth_info: tuple[str] | None = None
+_auth_info_gen_time = 0.0
+
+
 # https://pypi.org/project/msmcauthaio/
 async def load_auth_info() -> tuple[str]:
+    global _auth_info, _auth_info_gen_time
+    if _auth_info and time.time() - _auth_info_gen_time <= 86000.0:
+        return _auth_info
+
     # oh my god this is so stupid lmao
     (cache_dir := Path(user_cache_dir("proxhy"))).mkdir(parents=True, exist_ok=True)
     auth_cache_path = cache_dir / Path("auth")
@@ -66,4 +76,11 @@ async def load_auth_info() -> tuple[str]:
             )
         )
 
-    return user_profile.access_token, user_profile.username, user_profile.uuid, api_key
+    _auth_info_gen_time = float(access_token_gen_time)
+    _auth_info = (
+        user_profile.access_token,
+        user_profile.username,
+        user_profile.uuid,
+        api_key,
+    )
+    return _auth_info
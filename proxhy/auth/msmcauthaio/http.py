@@ -3,6 +3,7 @@ from typing import Dict, Optional, Union
 
 import aiohttp
 
+from ...http_pool import http_pool
 from .constants import BASE_HEADERS
 
 
@@ -11,12 +12,12 @@ class Http:
 
     def __init__(self, *, loop: asyncio.AbstractEventLoop = None):
         self.loop = loop or asyncio.get_event_loop()
-        self.session = aiohttp.ClientSession(loop=self.loop)
+        # shared with the rest of proxhy, so it isn't closed here
+        self.session = http_pool.session()
         self.loop.set_exception_handler(lambda _loop, _context: None)
 
     async def close(self):
-        """Close the HTTP session."""
-        await self.session.close()
+        """The session belongs to http_pool, which closes it."""
 
     async def request(
         self, url: str, method: str = "GET", **kwargs
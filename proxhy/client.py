@@ -1,13 +1,31 @@
 import asyncio
+import queue
+import threading
 import zlib
 from asyncio import StreamReader, StreamWriter
 from enum import Enum
 
-from .datatypes import Buffer, VarInt
+from .compression import CompressionPolicy, peek_packet_id
+from .datatypes import PacketView, VarInt
 from .encryption import Stream
+from .executor import HandlerExecutor, ThreadedExecutor
+from .feature_loop import feature_loop
+from .filters import PacketFilter, filter_rules, relay_cost
+from .offload import offloader
+from .scheduler import ClientScheduler, Frame
+from .scope import TaskScope
 
 client_listeners = {}
 server_listeners = {}
+client_observers = {}
+server_observers = {}
+# how many calls of a handler can run at once, 1 if it isn't in here
+handler_concurrency = {}
+# feature name -> (registry, key, listener or observer) for everything it
+# registered; connections can turn features off, see Client.set_feature
+features: dict[str, list[tuple[dict, tuple, object]]] = {}
+# feature name -> features that have to be on for it to work
+feature_requires: dict[str, set[str]] = {}
 
 
 class State(Enum):
@@ -17,9 +35,25 @@ class State(Enum):
     PLAY = 3
 
 
-def listen_client(packet_id: int, state: State = State.PLAY, blocking=False):
+def _add_to_feature(feature: str | None, registry: dict, key: tuple, entry):
+    if feature is not None:
+        features.setdefault(feature, []).append((registry, key, entry))
+        feature_requires.setdefault(feature, set())
+
+
+def listen_client(
+    packet_id: int,
+    state: State = State.PLAY,
+    blocking=False,
+    concurrency=1,
+    feature: str | None = None,
+):
     def wrapper(func):
         client_listeners.update({(packet_id, state): (func, blocking)})
+        handler_concurrency[func] = concurrency
+        _add_to_feature(
+            feature, client_listeners, (packet_id, state), (func, blocking)
+        )
 
         async def inner(*args, **kwargs):
             return await func(*args, **kwargs)
@@ -29,9 +63,19 @@ def listen_client(packet_id: int, state: State = State.PLAY, blocking=False):
     return wrapper
 
 
-def listen_server(packet_id: int, state: State = State.PLAY, blocking=False):
+def listen_server(
+    packet_id: int,
+    state: State = State.PLAY,
+    blocking=False,
+    concurrency=1,
+    feature: str | None = None,
+):
     def wrapper(func):
         server_listeners.update({(packet_id, state): (func, blocking)})
+        handler_concurrency[func] = concurrency
+        _add_to_feature(
+            feature, server_listeners, (packet_id, state), (func, blocking)
+        )
 
         async def inner(*args, **kwargs):
             return await func(*args, **kwargs)
@@ -41,9 +85,62 @@ def listen_server(packet_id: int, state: State = State.PLAY, blocking=False):
     return wrapper
 
 
+def observe_client(
+    packet_id: int,
+    state: State = State.PLAY,
+    concurrency=1,
+    feature: str | None = None,
+):
+    """
+    read-only listener; the packet is forwarded as-is before observers run,
+    and any number of observers can watch the same packet
+    """
+
+    def wrapper(func):
+        client_observers.setdefault((packet_id, state), []).append(func)
+        handler_concurrency[func] = concurrency
+        _add_to_feature(feature, client_observers, (packet_id, state), func)
+        return func
+
+    return wrapper
+
+
+def observe_server(
+    packet_id: int,
+    state: State = State.PLAY,
+    concurrency=1,
+    feature: str | None = None,
+):
+    """observe_client, for packets from the server"""
+
+    def wrapper(func):
+        server_observers.setdefault((packet_id, state), []).append(func)
+        handler_concurrency[func] = concurrency
+        _add_to_feature(feature, server_observers, (packet_id, state), func)
+        return func
+
+    return wrapper
+
+
 class Client:
     """represents a connection to a client and corresponding connection to server"""
 
+    # non-blocking handlers and observers are run by a pool of this many workers,
+    # and reading stops while this many calls are waiting for one
+    handler_workers = 4
+    max_queued_handlers = 1024
+    # deflate level for packets to the server; lower trades ratio for cpu
+    compression_level = 1
+    # also turn on compression for the client, so compressed packets that
+    # nothing listens to can be passed through without inflating them
+    compress_client = False
+    # run non-blocking handlers and observers on a second loop and thread,
+    # leaving this one to relay packets; handlers' sends are queued back to it
+    feature_thread = False
+    max_queued_sends = 1024
+    # features connections start with turned off
+    disabled_features: set[str] = set()
+
     def __init__(
         self,
         reader: StreamReader,
@@ -53,75 +150,364 @@ class Client:
 
         self.state = State.HANDSHAKING
         self.compression = False
+        self.client_compression = False
+        self.compression_policy = CompressionPolicy(self.compression_level)
+        self.packet_filter = PacketFilter(filter_rules)
         self.server_stream: Stream | None = None
 
-        asyncio.create_task(self.handle_client())
+        # this connection's own listener tables, without disabled features
+        self.disabled_features = set()
+        self._build_listeners()
+        for feature in type(self).disabled_features:
+            self.set_feature(feature, False)
+
+        self.relay_loop = asyncio.get_running_loop()
+        self._relay_thread = threading.get_ident()
+        if self.feature_thread:
+            self.handler_loop = feature_loop.get()
+            self.executor = ThreadedExecutor(
+                self.handler_loop,
+                self.handler_workers,
+                self.max_queued_handlers,
+                handler_concurrency,
+            )
+        else:
+            self.handler_loop = self.relay_loop
+            self.executor = HandlerExecutor(
+                self.handler_workers, self.max_queued_handlers, handler_concurrency
+            )
+        # packets handlers on the feature loop have sent, for the relay loop
+        self._sends: queue.Queue = queue.Queue(self.max_queued_sends)
+        self._sending = False
+
+        # every task started for this connection, cancelled when it closes
+        self.scope = TaskScope()
+        # packets for the client go out through this once in play
+        self.scheduler = ClientScheduler(self.client_stream, self.scope)
+        self.scope.create_task(self.handle_client())
+
+    async def close(self):
+        """tear the connection down, on the relay loop; safe to call again"""
+        if self.scope.closed:
+            return
+
+        # whichever task this is, the other read loop and handlers are cancelled
+        self.scope.close()
+        self.executor.close()
+        if self.server_stream:
+            self.server_stream.close()
+        # what the server sent before it went still reaches the client
+        self.scheduler.flush()
+        self.client_stream.close()
 
     def send_packet(self, stream: Stream, id: int, *data: bytes) -> None:
-        packet = VarInt.pack(id) + b"".join(data)
-        packet_length = VarInt.pack(len(packet))
-
-        if self.compression and stream is self.server_stream:
-            if len(packet) >= self.compression_threshold:
-                compressed_packet = zlib.compress(packet)
-                data_length = packet_length
-                packet = data_length + compressed_packet
-                packet_length = VarInt.pack(len(packet))
+        self._send(stream, id, VarInt.pack(id), *data, proxy=True)
+
+    def forward(self, stream: Stream, buff: PacketView) -> None:
+        """send a received packet on unchanged, without copying it"""
+        self._send(stream, buff.id, buff.packet)
+
+    async def on_handler_loop(self, coro):
+        """await coro on the loop handlers run on"""
+        return await self._on_loop(self.handler_loop, coro)
+
+    async def on_relay_loop(self, coro):
+        """await coro on the loop the streams belong to"""
+        return await self._on_loop(self.relay_loop, coro)
+
+    @staticmethod
+    async def _on_loop(loop: asyncio.AbstractEventLoop, coro):
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    def _send(
+        self, stream: Stream, packet_id: int, *parts: bytes | memoryview, proxy=False
+    ):
+        if self._relay_thread == threading.get_ident():
+            self._write_packet(stream, packet_id, *parts, proxy=proxy)
+            return
+
+        # streams belong to the relay loop; the feature thread waits here
+        # while the relay loop is this far behind
+        self._sends.put((stream, packet_id, parts, proxy))
+        if not self._sending:
+            self._sending = True
+            self.relay_loop.call_soon_threadsafe(self._write_sends)
+
+    def _write_sends(self):
+        self._sending = False
+        while True:
+            try:
+                stream, packet_id, parts, proxy = self._sends.get_nowait()
+            except queue.Empty:
+                return
+            self._write_packet(stream, packet_id, *parts, proxy=proxy)
+
+    def _write_packet(
+        self, stream: Stream, packet_id: int, *parts: bytes | memoryview, proxy=False
+    ) -> None:
+        """proxy is set for packets the proxy made rather than received"""
+        # the packet is handed to the stream as a list of parts and never joined here
+        length = sum(map(len, parts))
+
+        if stream is self.server_stream:
+            compressed = self.compression
+        else:
+            compressed = self.client_compression
+
+        if compressed:
+            if length < self.compression_threshold:
+                frame = (VarInt.pack(length + 1), b"\x00", *parts)
+            elif offloader.offloads("deflate", length):
+                # frames queued after this one wait for it
+                frame = offloader.submit(
+                    "deflate",
+                    length,
+                    self._compressed_frame,
+                    packet_id,
+                    b"".join(parts),
+                )
+            else:
+                frame = (self._compressed_frame(packet_id, b"".join(parts)),)
+        else:
+            frame = (VarInt.pack(length), *parts)
+        self._write_frame(stream, packet_id, frame, length, proxy)
+
+    def _write_frame(
+        self, stream: Stream, packet_id: int, frame: Frame, size: int, proxy=False
+    ) -> None:
+        if stream is self.client_stream and self.state is State.PLAY:
+            self.scheduler.write(packet_id, frame, size, proxy)
+        elif isinstance(frame, asyncio.Future):
+            stream.write_later(frame)
+        else:
+            stream.write(*frame)
+
+    def _compressed_frame(self, packet_id: int, packet: bytes) -> bytes:
+        compressed_packet = self.compression_policy.compress(packet_id, packet)
+        data_length = VarInt.pack(len(packet))
+        packet_length = VarInt.pack(len(data_length) + len(compressed_packet))
+        return b"".join((packet_length, data_length, compressed_packet))
+
+    async def _inflate(self, data: memoryview, data_length: int) -> memoryview:
+        if offloader.offloads("inflate", data_length):
+            data = await offloader.submit("inflate", data_length, zlib.decompress, data)
+        else:
+            data = zlib.decompress(data)
+        return memoryview(data)
+
+    def set_feature(self, name: str, enabled: bool) -> set[str]:
+        """
+        turn a feature on or off for this connection, along with the features
+        it needs (on) or that need it (off); returns the features changed
+        """
+        if name not in features:
+            raise KeyError(name)
+
+        changed = {name}
+        if enabled:
+            while needed := {
+                required
+                for feature in changed
+                for required in feature_requires.get(feature, ())
+                if required not in changed
+            }:
+                changed |= needed
+            changed &= self.disabled_features
+            self.disabled_features -= changed
+        else:
+            while needing := {
+                feature
+                for feature, requires in feature_requires.items()
+                if requires & changed and feature not in changed
+            }:
+                changed |= needing
+            changed -= self.disabled_features
+            self.disabled_features |= changed
+
+        self._build_listeners()
+        return changed
+
+    def _build_listeners(self):
+        tables = {
+            id(client_listeners): dict(client_listeners),
+            id(server_listeners): dict(server_listeners),
+            id(client_observers): {k: list(v) for k, v in client_observers.items()},
+            id(server_observers): {k: list(v) for k, v in server_observers.items()},
+        }
+        for feature in self.disabled_features:
+            for registry, key, entry in features[feature]:
+                table = tables[id(registry)]
+                if isinstance(table[key], list):
+                    table[key].remove(entry)
+                    if table[key]:
+                        continue
+                del table[key]
+
+        # swapped in whole, the relay loop may be reading the old ones
+        self.client_listeners = tables[id(client_listeners)]
+        self.server_listeners = tables[id(server_listeners)]
+        self.client_observers = tables[id(client_observers)]
+        self.server_observers = tables[id(server_observers)]
+
+    def _filtered(self, frame: bytes) -> bool:
+        """whether a rule drops this packet from the server, going by its header"""
+        if self.compression:
+            data_length, start = VarInt.unpack_from(frame)
+            if data_length:  # only as much as the id is inflated
+                packet_id = peek_packet_id(memoryview(frame)[start:])
             else:
-                packet = VarInt.pack(0) + VarInt.pack(id) + b"".join(data)
-                packet_length = VarInt.pack(len(packet))
+                packet_id = VarInt.unpack_from(frame, start)[0]
+                data_length = len(frame) - start
+        else:
+            packet_id = VarInt.unpack_from(frame)[0]
+            data_length = len(frame)
+
+        rule = self.packet_filter.rules.get((packet_id, self.state))
+        return rule is not None and self.packet_filter.drops(
+            rule, len(frame), data_length
+        )
 
-        stream.write(packet_length + packet)
+    def _handled(self, packet_id: int, listeners, observers) -> bool:
+        key = (packet_id, self.state)
+        return key in listeners or key in observers
 
     async def handle_client(self):
-        while packet_length := await VarInt.unpack_stream(self.client_stream):
-            if data := await self.client_stream.read(packet_length):
-                buff = Buffer(data)
-                packet_id = buff.unpack(VarInt)
-
-                # print(f"Client: {packet_id=}, {buff.getvalue()=}, {self.state=}")
-
-                # call packet handler
-                result = client_listeners.get((packet_id, self.state))
-                if result:
-                    handler, blocking = result
-                    if blocking:
-                        await handler(self, Buffer(buff.read()))
-                    else:
-                        asyncio.create_task(handler(self, Buffer(buff.read())))
+        try:
+            while frame := await self.client_stream.read_frame():
+                # movement and anything else nothing here looks at is recognised
+                # from the first bytes of the frame and sent on as it is
+                if self.client_compression:
+                    # a zero data length means the packet follows uncompressed
+                    packet_id = frame[1] if frame[0] == 0 else 0x80
                 else:
-                    self.send_packet(self.server_stream, packet_id, buff.read())
-        await self.close()
+                    packet_id = frame[0]
+
+                if (
+                    packet_id < 0x80  # one byte varint
+                    and (packet_id, self.state) not in self.client_listeners
+                    and (packet_id, self.state) not in self.client_observers
+                    and (
+                        self.compression == self.client_compression
+                        or len(frame) < self.compression_threshold
+                    )
+                ):
+                    if self.compression == self.client_compression:
+                        self.server_stream.write(VarInt.pack(len(frame)), frame)
+                    else:  # only the server expects a data length
+                        self.server_stream.write(
+                            VarInt.pack(len(frame) + 1), b"\x00", frame
+                        )
+                    packet = None
+                elif self.client_compression:
+                    data_length, start = VarInt.unpack_from(frame)
+                    packet = memoryview(frame)[start:]
+                    if data_length >= self.compression_threshold:
+                        if self.compression and not self._handled(
+                            peek_packet_id(packet),
+                            self.client_listeners,
+                            self.client_observers,
+                        ):
+                            # both legs use the same threshold, so it can go as is
+                            self.server_stream.write(VarInt.pack(len(frame)), frame)
+                            packet = None
+                        else:
+                            packet = await self._inflate(packet, data_length)
+                else:
+                    packet = memoryview(frame)
+
+                if packet is not None:
+                    packet_id, start = VarInt.unpack_from(packet)
+
+                    # print(f"Client: {packet_id=}, {packet[start:]=}, {self.state=}")
+
+                    # call packet handler
+                    result = self.client_listeners.get((packet_id, self.state))
+                    if result:
+                        handler, blocking = result
+                        buff = PacketView(packet, packet_id, start)
+                        if blocking:
+                            await handler(self, buff)
+                        else:
+                            await self.executor.submit(handler, self, buff)
+                    else:
+                        self._write_packet(self.server_stream, packet_id, packet)
+
+                    if observers := self.client_observers.get((packet_id, self.state)):
+                        for observer in observers:
+                            buff = PacketView(packet, packet_id, start)
+                            await self.executor.submit(observer, self, buff)
+
+                # stop reading from the client while the server isn't keeping up
+                if self.server_stream and self.server_stream.congested:
+                    await self.server_stream.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # the client went away; torn down like any other end
+        finally:
+            await self.close()
 
     async def handle_server(self):
-        data = b""
-        while packet_length := await VarInt.unpack_stream(self.server_stream):
-            while len(data) < packet_length:
-                newdata = await self.server_stream.read(packet_length - len(data))
-                data += newdata
-
-            buff = Buffer(data)
-            if self.compression:
-                data_length = buff.unpack(VarInt)
-                if data_length >= self.compression_threshold:
-                    # print(buff.getvalue())
-                    data = zlib.decompress(buff.read())
-                    buff = Buffer(data)
-
-            packet_id = buff.unpack(VarInt)
-            # print(f"Server: {packet_id=}, {buff.getvalue()=}, {self.state=}")
-
-            # call packet handler
-            result = server_listeners.get((packet_id, self.state))
-            if result:
-                handler, blocking = result
-                if blocking:
-                    await handler(self, Buffer(buff.read()))
+        try:
+            while frame := await self.server_stream.read_frame():
+                # filter rules come before anything else is done with a packet,
+                # and while there are any, what the rest costs is sampled
+                if self.packet_filter.rules:
+                    if self._filtered(frame):
+                        continue
+                    started = relay_cost.start()
                 else:
-                    asyncio.create_task(handler(self, Buffer(buff.read())))
-            else:
-                self.send_packet(self.client_stream, packet_id, buff.read())
+                    started = None
+
+                packet = memoryview(frame)
+                if self.compression:
+                    data_length, start = VarInt.unpack_from(packet)
+                    packet = packet[start:]
+                    if data_length >= self.compression_threshold:
+                        if self.client_compression and not self._handled(
+                            packet_id := peek_packet_id(packet),
+                            self.server_listeners,
+                            self.server_observers,
+                        ):
+                            # both legs use the same threshold, so it can go as is
+                            self._write_frame(
+                                self.client_stream,
+                                packet_id,
+                                (VarInt.pack(len(frame)), frame),
+                                len(frame),
+                            )
+                            packet = None
+                        else:
+                            packet = await self._inflate(packet, data_length)
+
+                if packet is not None:
+                    packet_id, start = VarInt.unpack_from(packet)
+                    # print(f"Server: {packet_id=}, {packet[start:]=}, {self.state=}")
+
+                    # call packet handler
+                    result = self.server_listeners.get((packet_id, self.state))
+                    if result:
+                        handler, blocking = result
+                        buff = PacketView(packet, packet_id, start)
+                        if blocking:
+                            await handler(self, buff)
+                        else:
+                            await self.executor.submit(handler, self, buff)
+                    else:
+                        self._write_packet(self.client_stream, packet_id, packet)
+
+                    if observers := self.server_observers.get((packet_id, self.state)):
+                        for observer in observers:
+                            buff = PacketView(packet, packet_id, start)
+                            await self.executor.submit(observer, self, buff)
 
-            data = b""
+                if started is not None:
+                    relay_cost.add(len(frame if packet is None else packet), started)
 
-        await self.close()
+                # stop reading from the server while the client isn't keeping up
+                if self.scheduler.congested:
+                    await self.scheduler.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # the server went away; torn down like any other end
+        finally:
+            await self.close()
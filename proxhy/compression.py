@@ -0,0 +1,102 @@
+import struct
+import threading
+import time
+import zlib
+
+from .datatypes import VarInt
+
+_STORED_BLOCK = struct.Struct("<BHH")
+_ADLER32 = struct.Struct(">I")
+
+
+def stored(data: bytes) -> bytes:
+    """
+    a zlib stream of stored (uncompressed) blocks, built without
+    setting up a compressor the way zlib.compress(data, 0) does
+    """
+    parts = [b"\x78\x01"]
+    for start in range(0, len(data), 0xFFFF):
+        block = data[start : start + 0xFFFF]
+        final = start + 0xFFFF >= len(data)
+        parts.append(_STORED_BLOCK.pack(final, len(block), len(block) ^ 0xFFFF))
+        parts.append(block)
+    parts.append(_ADLER32.pack(zlib.adler32(data)))
+    return b"".join(parts)
+
+
+def peek_packet_id(data: bytes | memoryview) -> int:
+    """the id of a compressed packet, inflating no more than the id itself"""
+    return VarInt.unpack_from(zlib.decompressobj().decompress(data, 5))[0]
+
+
+class CompressionPolicy:
+    """
+    deflates packets for one connection, falling back to stored (level 0)
+    blocks for packet ids whose payloads don't compress, and keeps count of
+    the bytes saved and the time spent doing it. packets are deflated on the
+    loop or in the offload pool, so the counts are kept under a lock
+    """
+
+    # packets that shrink less than this are sent stored next time
+    min_saving = 0.1
+    # how many packets of an incompressible id are stored before trying again
+    retry_after = 64
+    # smaller than zlib's default of 8; setting up the default's hash tables
+    # costs more than deflating a typical packet
+    mem_level = 4
+
+    def __init__(self, level: int = 1):
+        self.level = level
+
+        self.packets = 0
+        self.stored = 0  # packets sent without trying to compress them
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+        # packet id -> how many more packets are stored without trying
+        self._incompressible: dict[int, int] = {}
+
+    def compress(self, packet_id: int, data: bytes) -> bytes:
+        start = time.perf_counter()
+
+        with self._lock:
+            if skip := self._incompressible.get(packet_id):
+                self._incompressible[packet_id] = skip - 1
+                self.stored += 1
+
+        if skip:
+            compressed = stored(data)
+        else:
+            # no point in a window bigger than the packet
+            window = min(max((len(data) - 1).bit_length(), 9), zlib.MAX_WBITS)
+            compressor = zlib.compressobj(
+                self.level, zlib.DEFLATED, window, self.mem_level
+            )
+            compressed = compressor.compress(data) + compressor.flush()
+
+        with self._lock:
+            if not skip and len(compressed) > len(data) * (1 - self.min_saving):
+                self._incompressible[packet_id] = self.retry_after
+            self.seconds += time.perf_counter() - start
+            self.packets += 1
+            self.bytes_in += len(data)
+            self.bytes_out += len(compressed)
+        return compressed
+
+    @property
+    def saved(self) -> int:
+        return self.bytes_in - self.bytes_out
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            return {
+                "level": self.level,
+                "packets": self.packets,
+                "stored": self.stored,
+                "bytes in": self.bytes_in,
+                "bytes out": self.bytes_out,
+                "saved": self.saved,
+                "ms spent": round(self.seconds * 1000, 2),
+            }
@@ -7,12 +7,49 @@ import uuid
 from abc import ABC, abstractmethod
 from io import BytesIO
 
+_UNSIGNED_BYTE = struct.Struct(">B")
+_SHORT = struct.Struct(">h")
+_UNSIGNED_SHORT = struct.Struct(">H")
+_LONG = struct.Struct(">q")
+
 
 class Buffer(BytesIO):
     def unpack[T](self, kind: type[DataType[T]]) -> T:
         return kind.unpack(self)
 
 
+class PacketView:
+    """
+    read-only cursor over a received packet; fields are decoded in place
+    and the packet can be forwarded as it arrived without being copied
+    """
+
+    __slots__ = ("id", "packet", "_start", "_pos")
+
+    def __init__(self, packet: bytes | memoryview, id: int, start: int):
+        self.id = id
+        self.packet = memoryview(packet)  # packet id + payload
+        self._start = start  # where the payload starts
+        self._pos = start
+
+    def unpack[T](self, kind: type[DataType[T]]) -> T:
+        value, self._pos = kind.unpack_from(self.packet, self._pos)
+        return value
+
+    def read(self, n: int = -1) -> bytes:
+        end = len(self.packet) if n < 0 else min(len(self.packet), self._pos + n)
+        data = bytes(self.packet[self._pos : end])
+        self._pos = end
+        return data
+
+    def tell(self) -> int:
+        return self._pos - self._start
+
+    def getvalue(self) -> memoryview:
+        """the whole payload, without copying"""
+        return self.packet[self._start :]
+
+
 class DataType[T](ABC):
     def __init__(self, value: bytes | T):
         if isinstance(value, bytes):
@@ -32,39 +69,72 @@ class DataType[T](ABC):
     def unpack[B: BytesIO](buff: B) -> T:
         pass
 
+    @classmethod
+    def unpack_from(cls, data: bytes | memoryview, offset: int = 0) -> tuple[T, int]:
+        """decode a value at offset, returns (value, offset after the value)"""
+        buff = Buffer(data[offset:])
+        return cls.unpack(buff), offset + buff.tell()
+
+
+def _pack_varint(value: int) -> bytes:
+    # https://gist.github.com/nickelpro/7312782
+    total = bytearray()
+    val = (1 << 32) + value if value < 0 else value
+
+    while val >= 0x80:
+        total.append(0x80 | (val & 0x7F))
+        val >>= 7
+
+    total.append(val)
+    return bytes(total)
+
+
+# every one and two byte varint
+_VARINTS = tuple(_pack_varint(i) for i in range(1 << 14))
+
 
 class VarInt(DataType[int]):
     def __repr__(self) -> str:
         return str(self.value)
 
-    # https://gist.github.com/nickelpro/7312782
     @staticmethod
     def pack(value: int) -> bytes:
-        total = b""
-        val = (1 << 32) + value if value < 0 else value
-
-        while val >= 0x80:
-            bits = val & 0x7F
-            val >>= 7
-            total += struct.pack("B", (0x80 | bits))
-
-        bits = val & 0x7F
-        total += struct.pack("B", bits)
-        return total
+        if 0 <= value < 1 << 14:
+            return _VARINTS[value]
+        return _pack_varint(value)
 
     @staticmethod
     def unpack(buff) -> int:
         total = 0
         shift = 0
-        val = 0x80
 
-        while val & 0x80:
-            val = struct.unpack("B", buff.read(1))[0]
+        while True:
+            val = buff.read(1)[0]
             total |= (val & 0x7F) << shift
+            if val < 0x80:
+                break
             shift += 7
 
         return total - (1 << 32) if total & (1 << 31) else total
 
+    @staticmethod
+    def unpack_from(data: bytes | memoryview, offset: int = 0) -> tuple[int, int]:
+        val = data[offset]
+        if val < 0x80:
+            return val, offset + 1
+
+        total = val & 0x7F
+        shift = 7
+        while True:
+            offset += 1
+            val = data[offset]
+            total |= (val & 0x7F) << shift
+            if val < 0x80:
+                break
+            shift += 7
+
+        return (total - (1 << 32) if total & (1 << 31) else total), offset + 1
+
     @staticmethod
     async def unpack_stream(stream) -> int:
         total = 0
@@ -72,7 +142,7 @@ class VarInt(DataType[int]):
         val = 0x80
 
         while (val & 0x80) and (data := await stream.read(1)):
-            val = struct.unpack("B", data)[0]
+            val = data[0]
             total |= (val & 0x7F) << shift
             shift += 7
 
@@ -90,35 +160,53 @@ class String(DataType[str]):
         length = VarInt.unpack(buff)
         return buff.read(length).decode("utf-8")
 
+    @staticmethod
+    def unpack_from(data: bytes | memoryview, offset: int = 0) -> tuple[str, int]:
+        length, offset = VarInt.unpack_from(data, offset)
+        end = offset + length
+        return str(data[offset:end], "utf-8"), end
+
 
 class UnsignedShort(DataType[int]):
     @staticmethod
     def pack(value: int) -> bytes:
-        return struct.pack(">H", value)
+        return _UNSIGNED_SHORT.pack(value)
 
     @staticmethod
     def unpack(buff) -> int:
-        return struct.unpack(">H", buff.read(2))[0]
+        return _UNSIGNED_SHORT.unpack(buff.read(2))[0]
+
+    @staticmethod
+    def unpack_from(data: bytes | memoryview, offset: int = 0) -> tuple[int, int]:
+        return _UNSIGNED_SHORT.unpack_from(data, offset)[0], offset + 2
 
 
 class Short(DataType[int]):
     @staticmethod
     def pack(value: int) -> bytes:
-        return struct.pack(">h", value)
+        return _SHORT.pack(value)
 
     @staticmethod
     def unpack(buff) -> int:
-        return struct.unpack(">h", buff.read(2))[0]
+        return _SHORT.unpack(buff.read(2))[0]
+
+    @staticmethod
+    def unpack_from(data: bytes | memoryview, offset: int = 0) -> tuple[int, int]:
+        return _SHORT.unpack_from(data, offset)[0], offset + 2
 
 
 class Long(DataType[int]):
     @staticmethod
     def pack(value: int) -> bytes:
-        return struct.pack(">q", value)
+        return _LONG.pack(value)
 
     @staticmethod
     def unpack(buff) -> int:
-        return struct.unpack(">q", buff.read(8))[0]
+        return _LONG.unpack(buff.read(8))[0]
+
+    @staticmethod
+    def unpack_from(data: bytes | memoryview, offset: int = 0) -> tuple[int, int]:
+        return _LONG.unpack_from(data, offset)[0], offset + 8
 
 
 class Byte(DataType[bytes]):
@@ -130,6 +218,24 @@ class Byte(DataType[bytes]):
     def unpack(buff) -> bytes:
         return buff.read(1)
 
+    @staticmethod
+    def unpack_from(data: bytes | memoryview, offset: int = 0) -> tuple[bytes, int]:
+        return bytes(data[offset : offset + 1]), offset + 1
+
+
+class UnsignedByte(DataType[int]):
+    @staticmethod
+    def pack(value: int) -> bytes:
+        return _UNSIGNED_BYTE.pack(value)
+
+    @staticmethod
+    def unpack(buff) -> int:
+        return buff.read(1)[0]
+
+    @staticmethod
+    def unpack_from(data: bytes | memoryview, offset: int = 0) -> tuple[int, int]:
+        return data[offset], offset + 1
+
 
 class ByteArray(DataType[bytes]):
     @staticmethod
@@ -141,6 +247,12 @@ class ByteArray(DataType[bytes]):
         length = VarInt.unpack(buff)
         return buff.read(length)
 
+    @staticmethod
+    def unpack_from(data: bytes | memoryview, offset: int = 0) -> tuple[bytes, int]:
+        length, offset = VarInt.unpack_from(data, offset)
+        end = offset + length
+        return bytes(data[offset:end]), end
+
 
 # temporary solution
 class Chat(DataType[str]):
@@ -152,8 +264,17 @@ class Chat(DataType[str]):
 
     @staticmethod
     def unpack(buff) -> str:
+        return Chat._parse(buff.unpack(String))
+
+    @staticmethod
+    def unpack_from(data: bytes | memoryview, offset: int = 0) -> tuple[str, int]:
+        text, offset = String.unpack_from(data, offset)
+        return Chat._parse(text), offset
+
+    @staticmethod
+    def _parse(text: str) -> str:
         # https://github.com/barneygale/quarry/blob/master/quarry/types/chat.py#L86-L107
-        data = json.loads(buff.unpack(String))
+        data = json.loads(text)
 
         def parse(data):
             text = ""
@@ -185,6 +306,12 @@ class UUID(DataType[uuid.UUID]):
     def unpack(buff) -> uuid.UUID:
         return uuid.UUID(bytes=buff.read(16))
 
+    @staticmethod
+    def unpack_from(
+        data: bytes | memoryview, offset: int = 0
+    ) -> tuple[uuid.UUID, int]:
+        return uuid.UUID(bytes=bytes(data[offset : offset + 16])), offset + 16
+
 
 class Boolean(DataType[bool]):
     @staticmethod
@@ -194,3 +321,7 @@ class Boolean(DataType[bool]):
     @staticmethod
     def unpack(buff) -> bool:
         return bool(buff.read(1)[0])
+
+    @staticmethod
+    def unpack_from(data: bytes | memoryview, offset: int = 0) -> tuple[bool, int]:
+        return bool(data[offset]), offset + 1
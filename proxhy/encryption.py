@@ -1,3 +1,4 @@
+import asyncio
 from asyncio import StreamReader, StreamWriter
 from hashlib import sha1
 
@@ -8,6 +9,8 @@ from cryptography.hazmat.primitives.ciphers.algorithms import AES
 from cryptography.hazmat.primitives.ciphers.modes import CFB8
 from cryptography.hazmat.primitives.serialization import load_der_public_key
 
+from .offload import offloader
+
 
 class Stream:
     """
@@ -15,9 +18,38 @@ class Stream:
     I cannot be bothered to use them BOTH like come on man
     """
 
+    read_size = 2**16
+    # cfb8 update_into needs room for a block's worth of slack
+    _slack = AES.block_size // 8 - 1
+
+    # writes are queued and sent together at the end of the loop iteration,
+    # after flush_delay seconds, or as soon as flush_size bytes are queued
+    flush_size = 2**16
+    flush_delay = 0.0
+    # transport buffer size at which the other leg should stop reading
+    high_water = 2**20
+
     def __init__(self, reader: StreamReader, writer: StreamWriter):
         self.reader = reader
         self.writer = writer
+        # BufferedStream's, to decrypt or copy frames straight out of its buffer
+        self._read_view = getattr(reader, "read_view", None)
+
+        # decrypted bytes read from the socket; [_pos:_end] hasn't been handed out
+        self._buffer = bytearray(2 * self.read_size)
+        self._pos = 0
+        self._end = 0
+
+        self._pending: list[bytes | asyncio.Future] = []
+        self._pending_size = 0
+        self._deferred = 0  # futures in _pending
+        self._flush_handle: asyncio.Handle | None = None
+        # the cipher is stateful, so nothing else is encrypted while a batch
+        # is being encrypted off the loop
+        self._encrypting = False
+        self._closing = False
+        if writer is not None:
+            writer.transport.set_write_buffer_limits(high=self.high_water)
 
         self._key = None
         self.encrypted = False
@@ -29,28 +61,231 @@ class Stream:
 
     @key.setter
     def key(self, value):
+        # queued writes were made before the key change
+        self.flush()
+
         self.encrypted = True
         self._key = value
         self.cipher = Cipher(AES(self.key), CFB8(self.key), backend=default_backend())
         self.encryptor = self.cipher.encryptor()
         self.decryptor = self.cipher.decryptor()
 
+        # anything read ahead of the key change arrived encrypted
+        if self._pos < self._end:
+            self._buffer[self._pos : self._end] = self.decryptor.update(
+                bytes(self._buffer[self._pos : self._end])
+            )
+
+    def _reserve(self, n: int):
+        """make room for n more bytes after _end"""
+        if len(self._buffer) - self._end >= n:
+            return
+
+        if self._pos:
+            # move the unread partial frame to the front
+            with memoryview(self._buffer) as view:
+                view[: self._end - self._pos] = view[self._pos : self._end]
+            self._end -= self._pos
+            self._pos = 0
+        if (missing := n - (len(self._buffer) - self._end)) > 0:
+            self._buffer.extend(bytes(missing))
+
+    async def _fill(self) -> bool:
+        if self._read_view is not None:
+            data = await self._read_view(self.read_size)
+        else:
+            data = await self.reader.read(self.read_size)
+        if not data:
+            return False
+
+        if self._pos == self._end:
+            self._pos = self._end = 0
+        self._reserve(len(data) + self._slack)
+
+        if self.encrypted:
+            # decrypt everything that arrived in one call, straight into the buffer
+            with memoryview(self._buffer) as view:
+                if offloader.offloads("crypt", len(data)):
+                    # the reader's buffer can change while this is off the loop
+                    data = bytes(data)
+                    # released here, the pool may hold on to it
+                    with view[self._end :] as target:
+                        self._end += await offloader.submit(
+                            "crypt", len(data), self.decryptor.update_into, data, target
+                        )
+                else:
+                    self._end += self.decryptor.update_into(data, view[self._end :])
+        else:
+            self._buffer[self._end : self._end + len(data)] = data
+            self._end += len(data)
+        return True
+
+    def _next_frame(self) -> bytes | None:
+        buffer = self._buffer
+        end = self._end
+        pos = self._pos
+
+        length = 0
+        shift = 0
+        while True:
+            if pos >= end:
+                return None
+            byte = buffer[pos]
+            pos += 1
+            length |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+            if shift >= 35:
+                raise ValueError("VarInt is too big")
+
+        if end - pos < length:
+            return None
+
+        with memoryview(buffer) as view:
+            frame = bytes(view[pos : pos + length])
+        self._pos = pos + length
+        return frame
+
+    async def read_frame(self) -> bytes:
+        """read one length-prefixed packet; returns b"" once the stream is closed"""
+        while (frame := self._next_frame()) is None:
+            if not await self._fill():
+                return b""
+        return frame
+
     async def read(self, n=-1):
+        if self._pos < self._end:
+            end = self._end if n < 0 else min(self._end, self._pos + n)
+            data = bytes(self._buffer[self._pos : end])
+            self._pos = end
+            return data
+
         data = await self.reader.read(n)
         return self.decryptor.update(data) if self.encrypted else data
 
-    def write(self, data):
-        if self.open:
-            return self.writer.write(
-                self.encryptor.update(data) if self.encrypted else data
-            )
+    def write(self, *data):
+        """queue one or more buffers, which are sent back to back"""
+        if not self.open:
+            return
+
+        self._pending.extend(data)
+        self._pending_size += sum(map(len, data))
+        if self._pending_size >= self.flush_size:
+            self.flush()
+        elif self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            if self.flush_delay:
+                self._flush_handle = loop.call_later(self.flush_delay, self.flush)
+            else:
+                self._flush_handle = loop.call_soon(self.flush)
+
+    def write_later(self, future: asyncio.Future):
+        """queue bytes that aren't ready yet; anything written after them waits"""
+        if not self.open:
+            return
+
+        self._pending.append(future)
+        self._deferred += 1
+        future.add_done_callback(lambda _: self.flush())
+
+    def flush(self):
+        """hand everything queued to the transport in one call"""
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending or self._encrypting or not (self.open or self._closing):
+            return
+
+        if self._deferred:
+            pending = self._take_ready()
+            if not pending:
+                return
+        else:
+            pending = self._pending
+            self._pending, self._pending_size = [], 0
+
+        # gather the whole batch once; handing the transport lots of tiny
+        # buffers costs more than joining them
+        data = b"".join(pending)
+        if self.encrypted:
+            if offloader.offloads("crypt", len(data)):
+                self._encrypting = True
+                future = offloader.submit("crypt", len(data), self._encrypt, data)
+                future.add_done_callback(self._encrypted)
+                return
+            data = self._encrypt(data)
+        self.writer.write(data)
+
+    def _take_ready(self) -> list[bytes]:
+        """take what's queued before the first write_later that isn't done"""
+        ready = []
+        for part in self._pending:
+            if isinstance(part, asyncio.Future):
+                if not part.done():
+                    break
+                self._deferred -= 1
+                if part.cancelled() or part.exception() is not None:
+                    # the frames after it can't be sent without it
+                    self._abort(part)
+                    return []
+                ready.append(part.result())
+            else:
+                self._pending_size -= len(part)
+                ready.append(part)
+        del self._pending[: len(ready)]
+        return ready
+
+    def _encrypt(self, data: bytes) -> bytearray:
+        # the transport may hold on to what it's given,
+        # so this buffer can't be reused across flushes
+        encrypted = bytearray(len(data) + self._slack)
+        del encrypted[self.encryptor.update_into(data, encrypted) :]
+        return encrypted
+
+    def _encrypted(self, future: asyncio.Future):
+        self._encrypting = False
+        if future.cancelled() or future.exception() is not None:
+            # the cipher's state is lost with it
+            return self._abort(future)
+        self.writer.write(future.result())
+        self.flush()
+        if self._closing and not self._encrypting:
+            self._closing = False
+            self.writer.close()
+
+    def _abort(self, future: asyncio.Future):
+        """close the stream over a write that failed off the loop"""
+        error = "cancelled" if future.cancelled() else repr(future.exception())
+        print(f"Couldn't prepare a packet, closing the connection: {error}")
+        self.open = self._closing = False
+        self._pending, self._pending_size, self._deferred = [], 0, 0
+        self.writer.close()
+
+    @property
+    def buffered(self) -> int:
+        """bytes written that haven't gone out to the socket yet"""
+        return self.writer.transport.get_write_buffer_size() + self._pending_size
+
+    @property
+    def congested(self) -> bool:
+        """whether the peer isn't keeping up and reading into this stream should wait"""
+        return self.open and self.buffered >= self.high_water
 
     async def drain(self):
-        return await self.writer.drain()
+        self.flush()
+        try:
+            return await self.writer.drain()
+        except ConnectionError:
+            pass  # the read loop will see the connection close
 
     def close(self):
+        self.flush()
         self.open = False
-        return self.writer.close()
+        if self._encrypting:
+            self._closing = True  # closed once what's queued is sent
+        else:
+            return self.writer.close()
 
 
 def pkcs1_v15_padded_rsa_encrypt(der_public_key, decrypted):
@@ -0,0 +1,154 @@
+import asyncio
+import traceback
+from collections import Counter, deque
+from collections.abc import Awaitable, Callable
+
+Handler = Callable[..., Awaitable]
+
+
+class HandlerExecutor:
+    """
+    runs packet handlers from one ordered queue on a fixed pool of workers.
+    handlers start in the order they were submitted, and calls to the same
+    handler don't overlap unless its limit allows more than one at a time.
+    a call to a handler at its limit is set aside until one of that
+    handler's calls finishes, so it never holds up a worker
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_queued: int = 1024,
+        limits: dict[Handler, int] | None = None,
+    ):
+        self.limits = {} if limits is None else limits  # handler -> concurrency
+        self.peak_depth = 0
+
+        # calls submitted that haven't started, queued or set aside
+        self._slots = asyncio.Semaphore(max_queued)
+        self._queued = 0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._running: Counter[Handler] = Counter()
+        # handler -> calls set aside while it was at its limit, in order
+        self._waiting: dict[Handler, deque[tuple]] = {}
+        self._workers = [asyncio.create_task(self._work()) for _ in range(workers)]
+
+    @property
+    def depth(self) -> int:
+        """handler calls that haven't started yet"""
+        return self._queued
+
+    async def submit(self, handler: Handler, *args) -> None:
+        """queue a handler call; waits while max_queued haven't started"""
+        await self._slots.acquire()
+        self._queue.put_nowait((handler, args))
+
+        self._queued += 1
+        if self._queued > self.peak_depth:
+            self.peak_depth = self._queued
+
+    async def _next(self) -> tuple[Handler, tuple]:
+        return await self._queue.get()
+
+    def _started(self):
+        self._queued -= 1
+        self._slots.release()
+
+    async def _work(self):
+        while self._workers:
+            handler, args = await self._next()
+            if self._running[handler] >= self.limits.get(handler, 1):
+                # run by whichever worker finishes one of the handler's calls
+                self._waiting.setdefault(handler, deque()).append(args)
+                continue
+            await self._run(handler, args)
+
+    async def _run(self, handler: Handler, args: tuple):
+        self._running[handler] += 1
+        try:
+            while True:
+                self._started()
+                try:
+                    await handler(*args)
+                except Exception:
+                    traceback.print_exc()
+
+                if not (waiting := self._waiting.get(handler)):
+                    break
+                args = waiting.popleft()
+        finally:
+            self._running[handler] -= 1
+
+    def close(self):
+        # a handler can close its own connection, so let that one finish
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            if worker is not asyncio.current_task():
+                worker.cancel()
+
+
+class ThreadedExecutor(HandlerExecutor):
+    """
+    HandlerExecutor whose workers run on another thread's loop. calls are
+    handed over in the order they were submitted, and submitting waits while
+    max_queued of them haven't been picked up by a worker
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        workers: int = 4,
+        max_queued: int = 1024,
+        limits: dict[Handler, int] | None = None,
+    ):
+        self.loop = loop  # where handlers run
+        self.limits = {} if limits is None else limits
+        self.peak_depth = 0
+
+        # the bound is kept on the submitting side, so the loops never wait
+        # on each other; only this coroutine waits for a free slot
+        self._submitter = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(max_queued)
+        self._queued = 0
+        self._inbox: deque[tuple[Handler, tuple]] = deque()
+        self._delivering = False
+
+        # only used on self.loop
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._running: Counter[Handler] = Counter()
+        self._waiting: dict[Handler, deque[tuple]] = {}
+        self._workers: list[asyncio.Task] = []
+        loop.call_soon_threadsafe(self._start, workers)
+
+    def _start(self, workers: int):
+        self._workers = [self.loop.create_task(self._work()) for _ in range(workers)]
+
+    async def submit(self, handler: Handler, *args) -> None:
+        await self._slots.acquire()
+        self._inbox.append((handler, args))
+        # one wakeup for however many calls are submitted before it's handled
+        if not self._delivering:
+            self._delivering = True
+            self.loop.call_soon_threadsafe(self._deliver)
+
+        self._queued += 1
+        if self._queued > self.peak_depth:
+            self.peak_depth = self._queued
+
+    def _deliver(self):
+        self._delivering = False
+        while self._inbox:
+            self._queue.put_nowait(self._inbox.popleft())
+
+    def _started(self):
+        self._submitter.call_soon_threadsafe(self._release)
+
+    def _release(self):
+        self._queued -= 1
+        self._slots.release()
+
+    def close(self):
+        if asyncio.get_running_loop() is self.loop:
+            super().close()
+        else:
+            self.loop.call_soon_threadsafe(super().close)
@@ -0,0 +1,35 @@
+import asyncio
+import threading
+
+
+class FeatureLoop:
+    """
+    a second event loop, on its own thread, for listeners and observers.
+    the loop connections are accepted on is left to relay packets (framing,
+    crypto and forwarding), so feature work like stats lookups, json and
+    commands doesn't hold up packets nothing is waiting on
+    """
+
+    def __init__(self, name: str = "proxhy-features"):
+        self.name = name
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def get(self) -> asyncio.AbstractEventLoop:
+        """the loop, started on first use"""
+        if self._loop is None:
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+            threading.Thread(
+                target=self._run, args=(loop, started), name=self.name, daemon=True
+            ).start()
+            started.wait()
+            self._loop = loop
+        return self._loop
+
+    def _run(self, loop: asyncio.AbstractEventLoop, started: threading.Event):
+        asyncio.set_event_loop(loop)
+        loop.call_soon(started.set)
+        loop.run_forever()
+
+
+feature_loop = FeatureLoop()
@@ -0,0 +1,149 @@
+import json
+import time
+from pathlib import Path
+
+from appdirs import user_config_dir
+
+# a game tick, which rate limits are counted in
+TICK = 0.05
+
+
+class Rule:
+    """
+    drops packets with this id in this state from the server, or lets
+    per_tick of them through each tick and drops the rest
+    """
+
+    def __init__(self, packet_id: int, state, per_tick: int = 0):
+        self.packet_id = packet_id
+        self.state = state
+        self.per_tick = per_tick
+
+        # counted across every connection
+        self.packets = 0
+        self.dropped = 0
+        self.bytes = 0  # read from the socket
+        self.inflated_bytes = 0  # that would have been decompressed and relayed
+        self.seconds = 0.0  # relay time saved, estimated by RelayCost
+
+    @property
+    def name(self) -> str:
+        action = f"limit {self.per_tick}/tick" if self.per_tick else "drop"
+        return f"{self.packet_id:#04x} {self.state.name.lower()} {action}"
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "packets": self.packets,
+            "dropped": self.dropped,
+            "KB saved": round(self.bytes / 1000, 1),
+            "inflated KB saved": round(self.inflated_bytes / 1000, 1),
+            "ms saved": round(self.seconds * 1000, 2),
+        }
+
+
+class RelayCost:
+    """
+    what relaying a packet costs by its size (in powers of two), timed
+    for one packet in every sample_every while any rule is loaded
+    """
+
+    sample_every = 64
+
+    def __init__(self):
+        self.seconds = [0.0] * 33
+        self.packets = [0] * 33
+        self._count = 0
+
+    def start(self) -> float | None:
+        """the time to pass to add(), or None if this packet isn't sampled"""
+        self._count += 1
+        if self._count % self.sample_every == 0:
+            return time.perf_counter()
+        return None
+
+    def add(self, size: int, started: float):
+        bucket = size.bit_length()
+        self.seconds[bucket] += time.perf_counter() - started
+        self.packets[bucket] += 1
+
+    def estimate(self, size: int) -> float:
+        """mean time for packets of this size, or the nearest size timed"""
+        bucket = size.bit_length()
+        for distance in range(len(self.packets)):
+            for nearby in (bucket - distance, bucket + distance):
+                if 0 <= nearby < len(self.packets) and self.packets[nearby]:
+                    return self.seconds[nearby] / self.packets[nearby]
+        return 0.0
+
+
+class PacketFilter:
+    """applies the rules to one connection, keeping its rate limits"""
+
+    def __init__(self, rules: dict[tuple, Rule]):
+        self.rules = rules
+        self._ticks: dict[Rule, tuple[int, int]] = {}  # rule -> (tick, packets)
+
+    def drops(self, rule: Rule, size: int, data_length: int) -> bool:
+        rule.packets += 1
+        if rule.per_tick:
+            tick = int(time.monotonic() / TICK)
+            last_tick, packets = self._ticks.get(rule, (tick, 0))
+            if last_tick != tick:
+                packets = 0
+            self._ticks[rule] = (tick, packets + 1)
+            if packets < rule.per_tick:
+                return False
+
+        rule.dropped += 1
+        rule.bytes += size
+        rule.inflated_bytes += data_length
+        rule.seconds += relay_cost.estimate(data_length)
+        return True
+
+
+def load_rules(path: Path | str | None = None) -> dict[tuple, Rule]:
+    """
+    read rules from a json list like
+    [{"packet": "0x2A", "action": "drop"},
+     {"packet": "0x29", "state": "play", "action": "limit", "per_tick": 2}]
+    from path, or filters.json in the config directory if there is one
+    """
+    from .client import State
+
+    if path is None:
+        path = Path(user_config_dir("proxhy")) / "filters.json"
+        if not path.exists():
+            return filter_rules
+
+    try:
+        with open(path) as file:
+            entries = json.load(file)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"can't read filter rules from {path}: {e}")
+
+    rules = {}
+    for entry in entries:
+        try:
+            packet_id = entry["packet"]
+            if isinstance(packet_id, str):
+                packet_id = int(packet_id, 0)
+            state = State[entry.get("state", "play").upper()]
+            action = entry.get("action", "drop")
+            if action == "drop":
+                per_tick = 0
+            elif action == "limit" and entry.get("per_tick", 0) > 0:
+                per_tick = int(entry["per_tick"])
+            else:
+                raise ValueError(f"unknown action {action!r} or no per_tick")
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"bad filter rule {entry} in {path}: {e}")
+        rules[(packet_id, state)] = Rule(packet_id, state, per_tick)
+
+    filter_rules.clear()
+    filter_rules.update(rules)
+    return filter_rules
+
+
+# (packet id, state) -> rule, for packets from the server
+filter_rules: dict[tuple, Rule] = {}
+relay_cost = RelayCost()
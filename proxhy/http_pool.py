@@ -0,0 +1,91 @@
+import asyncio
+from collections import Counter
+
+import aiohttp
+
+
+class HttpPool:
+    """
+    the aiohttp session all outbound http goes through: the session server
+    on login, hypixel and mojang lookups, and microsoft login. connections
+    are kept alive and dns answers cached between requests, so a login or
+    lookup doesn't pay for a handshake and a lookup of its own. sessions
+    belong to a loop, so there's one for each loop requests are made on
+    """
+
+    limit = 64  # connections open at once, in all
+    limit_per_host = 8
+    keepalive_timeout = 60  # seconds an idle connection is kept
+    dns_ttl = 5 * 60
+    timeout = 10  # seconds a request can take, like hypixel.py's default
+
+    def __init__(self):
+        self._sessions: dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        # requests, connections made and reused, dns cache hits and misses
+        self.counts: Counter[str] = Counter()
+        self.in_flight = 0
+
+    def session(self) -> aiohttp.ClientSession:
+        """the running loop's session, made on first use"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            trace = aiohttp.TraceConfig()
+            for signal, name in (
+                (trace.on_request_start, "requests"),
+                (trace.on_connection_create_end, "connections made"),
+                (trace.on_connection_reuseconn, "connections reused"),
+                (trace.on_dns_cache_hit, "dns cache hits"),
+                (trace.on_dns_cache_miss, "dns cache misses"),
+            ):
+                signal.append(self._counter(name))
+            trace.on_request_start.append(self._started)
+            trace.on_request_end.append(self._ended)
+            trace.on_request_exception.append(self._ended)
+
+            session = self._sessions[loop] = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    keepalive_timeout=self.keepalive_timeout,
+                    ttl_dns_cache=self.dns_ttl,
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[trace],
+            )
+        return session
+
+    def _counter(self, name: str):
+        async def count(_session, _context, _params):
+            self.counts[name] += 1
+
+        return count
+
+    async def _started(self, _session, _context, _params):
+        self.in_flight += 1
+
+    async def _ended(self, _session, _context, _params):
+        self.in_flight -= 1
+
+    async def close(self):
+        """close every session, each on its own loop; for shutting down"""
+        sessions, self._sessions = self._sessions, {}
+        running = asyncio.get_running_loop()
+        for loop, session in sessions.items():
+            if loop is running:
+                await session.close()
+            elif not loop.is_closed():
+                future = asyncio.run_coroutine_threadsafe(session.close(), loop)
+                await asyncio.wrap_future(future)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "connection limit": self.limit,
+            "limit per host": self.limit_per_host,
+            "requests in flight": self.in_flight,
+            **{name: self.counts[name] for name in sorted(self.counts)},
+        }
+
+
+http_pool = HttpPool()
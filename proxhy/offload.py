@@ -0,0 +1,75 @@
+import asyncio
+import os
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Offloader:
+    """
+    runs big zlib and aes jobs on a thread pool instead of the event loop;
+    both release the gil, so one big chunk doesn't hold up every other
+    connection. jobs below the size for their kind aren't worth the handoff
+    and are left for the caller to run inline
+    """
+
+    # bytes of input (output for inflate) from which a job is offloaded
+    min_size = {"inflate": 2**16, "deflate": 2**14, "crypt": 2**14}
+
+    def __init__(self, workers: int | None = None):
+        # one core is left for the loop; with none to spare, nothing is offloaded
+        if workers is None:
+            workers = min(4, (os.cpu_count() or 1) - 1)
+        self.workers = workers
+        self._executor: ThreadPoolExecutor | None = None
+
+        # the counts are kept by the loops and the pool's threads
+        self._lock = threading.Lock()
+        self.jobs: Counter[str] = Counter()
+        self.bytes: Counter[str] = Counter()
+        # time spent in the pool, i.e. loop time saved, before the handoff cost
+        self.seconds: Counter[str] = Counter()
+        # time the loop spent handing jobs off
+        self.handoff_seconds = 0.0
+
+    def offloads(self, kind: str, size: int) -> bool:
+        return self.workers > 0 and size >= self.min_size[kind]
+
+    def submit(self, kind: str, size: int, func: Callable, *args) -> asyncio.Future:
+        """run func(*args) in the pool; the future resolves on the loop"""
+        start = time.perf_counter()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, "proxhy-offload")
+
+        future = asyncio.get_running_loop().run_in_executor(
+            self._executor, self._run, kind, func, args
+        )
+        with self._lock:
+            self.jobs[kind] += 1
+            self.bytes[kind] += size
+            self.handoff_seconds += time.perf_counter() - start
+        return future
+
+    def _run(self, kind: str, func: Callable, args: tuple):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.seconds[kind] += elapsed
+
+    def stats(self) -> dict[str, int | float]:
+        stats = {}
+        with self._lock:
+            for kind in self.min_size:
+                stats[f"{kind} jobs"] = self.jobs[kind]
+                stats[f"{kind} MB"] = round(self.bytes[kind] / 1e6, 2)
+                stats[f"{kind} ms saved"] = round(self.seconds[kind] * 1000, 2)
+            stats["handoff ms"] = round(self.handoff_seconds * 1000, 2)
+        return stats
+
+
+offloader = Offloader()
@@ -0,0 +1,53 @@
+from .datatypes import UUID, Chat, String, UnsignedByte, VarInt
+from .schema import Array, Field, Option, Packet, Record, When
+
+# https://wiki.vg/index.php?title=Protocol&oldid=7368#Teams
+Teams = Packet(
+    0x3E,
+    "Teams",
+    Field("name", String),
+    Field("mode", UnsignedByte),
+    When(
+        "mode",
+        {0, 2},  # create, update info
+        Field("display_name", String),
+        Field("prefix", String),
+        Field("suffix", String),
+        Field("friendly_fire", UnsignedByte),
+        Field("name_tag_visibility", String),
+        Field("color", UnsignedByte),
+    ),
+    When("mode", {0, 3, 4}, Field("players", Array(String))),  # create, add, remove
+)
+
+# https://wiki.vg/index.php?title=Protocol&oldid=7368#Player_List_Item
+Property = Record(
+    "Property",
+    Field("name", String),
+    Field("value", String),
+    Field("signature", Option(String)),
+)
+
+PlayerListEntry = Record(
+    "PlayerListEntry",
+    Field("uuid", UUID),
+    When(
+        "action",
+        {0},  # add player
+        Field("name", String),
+        Field("properties", Array(Property)),
+        Field("gamemode", VarInt),
+        Field("ping", VarInt),
+        Field("display_name", Option(Chat)),
+    ),
+    When("action", {1}, Field("gamemode", VarInt)),
+    When("action", {2}, Field("ping", VarInt)),
+    When("action", {3}, Field("display_name", Option(Chat))),
+)
+
+PlayerListItem = Packet(
+    0x38,
+    "PlayerListItem",
+    Field("action", VarInt),
+    Field("players", Array(PlayerListEntry)),
+)
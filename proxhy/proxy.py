@@ -7,7 +7,6 @@ import uuid
 from pathlib import Path
 from secrets import token_bytes
 
-import aiohttp
 import hypixel
 from hypixel.errors import (
     HypixelException,
@@ -16,26 +15,40 @@ from hypixel.errors import (
     RateLimitError,
 )
 
+from . import packets, transport
 from .aliases import Gamemode, Statistic
+from .api import INTERACTIVE, HypixelClient, api_priority, api_scheduler, load_keys
 from .auth import load_auth_info
-from .client import Client, State, listen_client, listen_server
+from .client import (
+    Client,
+    State,
+    feature_requires,
+    features,
+    listen_client,
+    listen_server,
+    observe_client,
+    observe_server,
+)
 from .command import command, commands
 from .datatypes import (
     UUID,
-    Boolean,
-    Buffer,
-    Byte,
     ByteArray,
     Chat,
     Long,
+    PacketView,
     String,
     UnsignedShort,
     VarInt,
 )
 from .encryption import Stream, generate_verification_hash, pkcs1_v15_padded_rsa_encrypt
 from .errors import CommandException
+from .filters import filter_rules, load_rules
 from .formatting import FormattedPlayer
+from .http_pool import http_pool
 from .models import Game, Team, Teams
+from .offload import offloader
+from .scope import TaskScope
+from .stats_cache import player_cache
 from PyQt5.QtCore import QObject, QThread, pyqtSignal
 
 class ProxyThread(QThread):
@@ -62,6 +75,10 @@ class Proxy(QObject):
         self.proxy_thread = proxy_thread
         self.host = "localhost"  # Set your desired host
         self.port = 25565  # Set your desired port
+        self.buffered = False  # use the BufferedProtocol transport
+        self.compress_client = False  # pass compressed packets through to the client
+        self.feature_thread = False  # run listeners on their own thread
+        self.disabled_features = set()  # features connections start without
 
     def run(self) -> None:
         self.loop = asyncio.new_event_loop()
@@ -76,9 +93,24 @@ class Proxy(QObject):
 
     async def start(self):
         await load_auth_info()
-        server = await asyncio.start_server(self.handle_client, self.host, self.port)
-        async with server:
-            await server.serve_forever()
+        load_rules()
+        load_keys()
+        ProxyClient.compress_client = self.compress_client
+        ProxyClient.feature_thread = self.feature_thread
+        ProxyClient.disabled_features = self.disabled_features
+        start_server = transport.start_server if self.buffered else asyncio.start_server
+        server = await start_server(self.handle_client, self.host, self.port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await http_pool.close()
+
+
+# tab stats are worked out from the teams and the game /locraw reports
+feature_requires["stats"] = {"teams", "locraw"}
+# and locraw takes having no teams to mean the player really is in limbo
+feature_requires["locraw"] = {"teams"}
 
 
 class ProxyClient(Client):
@@ -99,7 +131,10 @@ class ProxyClient(Client):
     }
 
     def __init__(
-        self, reader: StreamReader, writer: StreamWriter, proxy_thread: ProxyThread
+        self,
+        reader: StreamReader,
+        writer: StreamWriter,
+        proxy_thread: ProxyThread | None = None,
     ):
         super().__init__(reader=reader, writer=writer)
 
@@ -120,14 +155,24 @@ class ProxyClient(Client):
         self.waiting_for_locraw = False
 
     async def close(self):
-        if self.server_stream:
-            self.server_stream.close()
+        # both read loops end up here, and so can handlers
+        if self.scope.closed:
+            return
+        if self.relay_loop is not asyncio.get_running_loop():
+            return await self.on_relay_loop(self.close())
+
+        # stats lookups are in the scope too
+        await super().close()
+        await self.on_handler_loop(self._close_features())
+
+    async def _close_features(self):
         if self.hypixel_client:
-            await self.hypixel_client.close()
-        self.client_stream.close()
+            hypixel_client, self.hypixel_client = self.hypixel_client, None
+            await hypixel_client.close()
 
-        del self  # idk if this does anything or not
-        # on second thought probably not but whatever
+        await self._flush_players()
+        self.players_getting_stats.clear()
+        self.teams.clear()
 
     @listen_client(0x00, State.STATUS, blocking=True)
     async def packet_status_request(self, _):
@@ -136,7 +181,7 @@ class ProxyClient(Client):
         )
 
     @listen_client(0x00, State.HANDSHAKING, blocking=True)
-    async def packet_handshake(self, buff: Buffer):
+    async def packet_handshake(self, buff: PacketView):
         if len(buff.getvalue()) <= 2:  # https://wiki.vg/Server_List_Ping#Status_Request
             return
 
@@ -147,9 +192,14 @@ class ProxyClient(Client):
 
         self.state = State(next_state)
         if self.state == State.LOGIN:
-            reader, writer = await asyncio.open_connection("mc.hypixel.net", 25565)
+            # upstream leg uses the same transport as the client leg
+            if isinstance(self.client_stream.reader, transport.BufferedStream):
+                open_connection = transport.open_connection
+            else:
+                open_connection = asyncio.open_connection
+            reader, writer = await open_connection("mc.hypixel.net", 25565)
             self.server_stream = Stream(reader, writer)
-            asyncio.create_task(self.handle_server())
+            self.scope.create_task(self.handle_server())
 
             self.send_packet(
                 self.server_stream,
@@ -161,14 +211,14 @@ class ProxyClient(Client):
             )
 
     @listen_client(0x01, State.STATUS, blocking=True)
-    async def packet_ping_request(self, buff: Buffer):
+    async def packet_ping_request(self, buff: PacketView):
         payload = buff.unpack(Long)
         self.send_packet(self.client_stream, 0x01, Long.pack(payload))
         # close connection
         await self.close()
 
     @listen_client(0x00, State.LOGIN)
-    async def packet_login_start(self, buff: Buffer):
+    async def packet_login_start(self, buff: PacketView):
         (
             self.access_token,
             self.username,
@@ -183,7 +233,7 @@ class ProxyClient(Client):
         self.send_packet(self.server_stream, 0x00, String.pack(self.username))
 
     @listen_server(0x01, State.LOGIN, blocking=True)
-    async def packet_encryption_request(self, buff: Buffer):
+    async def packet_encryption_request(self, buff: PacketView):
         server_id = buff.unpack(String).encode("utf-8")
         public_key = buff.unpack(ByteArray)
         verify_token = buff.unpack(ByteArray)
@@ -195,16 +245,15 @@ class ProxyClient(Client):
             "selectedProfile": self.uuid,
             "serverId": generate_verification_hash(server_id, secret, public_key),
         }
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                "https://sessionserver.mojang.com/session/minecraft/join",
-                json=payload,
-                ssl=False,
-            ) as response:
-                if not response.status == 204:
-                    raise Exception(
-                        f"Login failed: {response.status} {await response.json()}"
-                    )
+        async with http_pool.session().post(
+            "https://sessionserver.mojang.com/session/minecraft/join",
+            json=payload,
+            ssl=False,
+        ) as response:
+            if not response.status == 204:
+                raise Exception(
+                    f"Login failed: {response.status} {await response.json()}"
+                )
 
         encrypted_secret = pkcs1_v15_padded_rsa_encrypt(public_key, secret)
         encrypted_verify_token = pkcs1_v15_padded_rsa_encrypt(public_key, verify_token)
@@ -220,20 +269,26 @@ class ProxyClient(Client):
         self.server_stream.key = secret
 
     @listen_server(0x02, State.LOGIN, blocking=True)
-    async def packet_login_success(self, buff: Buffer):
+    async def packet_login_success(self, buff: PacketView):
         self.state = State.PLAY
-        self.hypixel_client = hypixel.Client(self.hypixel_api_key)
-        self.send_packet(self.client_stream, 0x02, buff.read())
+        # made for the loop the stats lookups run on
+        self.hypixel_client = HypixelClient(
+            self.hypixel_api_key, loop=self.handler_loop
+        )
+        self.forward(self.client_stream, buff)
 
     @listen_server(0x03, State.LOGIN, blocking=True)
-    async def packet_set_compression(self, buff: Buffer):
+    async def packet_set_compression(self, buff: PacketView):
         self.compression_threshold = buff.unpack(VarInt)
         self.compression = False if self.compression_threshold == -1 else True
 
-    @listen_client(0x17)
-    async def packet_plugin_channel(self, buff: Buffer):
-        self.send_packet(self.server_stream, 0x17, buff.getvalue())
+        if self.compression and self.compress_client:
+            # this goes out uncompressed, everything after it compressed
+            self.forward(self.client_stream, buff)
+            self.client_compression = True
 
+    @observe_client(0x17)
+    async def packet_plugin_channel(self, buff: PacketView):
         channel = buff.unpack(String)
         data = buff.unpack(ByteArray)
         if channel == "MC|Brand":
@@ -242,75 +297,61 @@ class ProxyClient(Client):
             elif b"vanilla" in data:
                 self.client = "vanilla"
 
-    @listen_server(0x01, blocking=True)
-    async def packet_join_game(self, buff: Buffer):
-        # flush player lists
-        self.players.clear()
-        self.players_old.clear()
-        self.players_with_stats.clear()
+    @listen_server(0x01, blocking=True, feature="locraw")
+    async def packet_join_game(self, buff: PacketView):
+        # player lists belong to the handlers, so they're flushed in line with them
+        await self.executor.submit(self._flush_players)
 
-        self.send_packet(self.client_stream, 0x01, buff.getvalue())
+        self.forward(self.client_stream, buff)
 
         self.waiting_for_locraw = True
         self.send_packet(self.server_stream, 0x01, String.pack("/locraw"))
 
-    @listen_server(0x0C)
-    async def packet_spawn_player(self, buff: Buffer):
-        self.send_packet(self.client_stream, 0x0C, buff.getvalue())
+    async def _flush_players(self):
+        self.players.clear()
+        self.players_old.clear()
+        self.players_with_stats.clear()
 
+    @observe_server(0x0C)
+    async def packet_spawn_player(self, buff: PacketView):
         eid = buff.unpack(VarInt)
         uuid = buff.unpack(UUID)
 
-    @listen_server(0x3E, blocking=True)
-    async def packet_teams(self, buff: Buffer):
-        name = buff.unpack(String)
-        mode = buff.unpack(Byte)
+    @observe_server(0x3E, feature="teams")
+    async def packet_teams(self, buff: PacketView):
+        packet = packets.Teams.decode(buff.getvalue())
         # team creation
-        if mode == b"\x00":
-            display_name = buff.unpack(String)
-            prefix = buff.unpack(String)
-            suffix = buff.unpack(String)
-            friendly_fire = buff.unpack(Byte)[0]
-            name_tag_visibility = buff.unpack(String)
-            color = buff.unpack(Byte)[0]
-
-            player_count = buff.unpack(VarInt)
-            players = set()
-            for _ in range(player_count):
-                players.add(buff.unpack(String))
-
+        if packet.mode == 0:
             self.teams.append(
                 Team(
-                    name,
-                    display_name,
-                    prefix,
-                    suffix,
-                    friendly_fire,
-                    name_tag_visibility,
-                    color,
-                    players,
+                    packet.name,
+                    packet.display_name,
+                    packet.prefix,
+                    packet.suffix,
+                    packet.friendly_fire,
+                    packet.name_tag_visibility,
+                    packet.color,
+                    set(packet.players),
                 )
             )
         # team removal
-        elif mode == b"\x01":
-            del self.teams[name]
+        elif packet.mode == 1:
+            del self.teams[packet.name]
         # team information updation
-        elif mode == b"\x02":
-            self.teams[name].display_name = buff.unpack(String)
-            self.teams[name].prefix = buff.unpack(String)
-            self.teams[name].suffix = buff.unpack(String)
-            self.teams[name].friendly_fire = buff.unpack(Byte)[0]
-            self.teams[name].name_tag_visibility = buff.unpack(String)
-            self.teams[name].color = buff.unpack(Byte)[0]
+        elif packet.mode == 2:
+            team = self.teams[packet.name]
+            team.display_name = packet.display_name
+            team.prefix = packet.prefix
+            team.suffix = packet.suffix
+            team.friendly_fire = packet.friendly_fire
+            team.name_tag_visibility = packet.name_tag_visibility
+            team.color = packet.color
         # add players to team
-        elif mode in {b"\x03", b"\x04"}:
-            add = True if mode == b"\x03" else False
-            player_count = buff.unpack(VarInt)
-            players = {buff.unpack(String) for _ in range(player_count)}
-            if add:
-                self.teams[name].players |= players
-            else:
-                self.teams[name].players -= players
+        elif packet.mode == 3:
+            self.teams[packet.name].players |= set(packet.players)
+        # remove players from team
+        elif packet.mode == 4:
+            self.teams[packet.name].players -= set(packet.players)
 
         for name, (_uuid, display_name) in self.players_with_stats.items():
             prefix, suffix = next(
@@ -324,17 +365,19 @@ class ProxyClient(Client):
             self.send_packet(
                 self.client_stream,
                 0x38,
-                VarInt.pack(3),
-                VarInt.pack(1),
-                UUID.pack(uuid.UUID(str(_uuid))),
-                Boolean.pack(True),
-                Chat.pack(prefix + display_name + suffix),
+                *packets.PlayerListItem.pack(
+                    action=3,
+                    players=[
+                        packets.PlayerListEntry(
+                            uuid=uuid.UUID(str(_uuid)),
+                            display_name=prefix + display_name + suffix,
+                        )
+                    ],
+                ),
             )
 
-        self.send_packet(self.client_stream, 0x3E, buff.getvalue())
-
-    @listen_server(0x02)
-    async def packet_chat_message(self, buff: Buffer):
+    @listen_server(0x02, feature="locraw")
+    async def packet_chat_message(self, buff: PacketView):
         message = buff.unpack(Chat)
         if re.match(r"^\{.*\}$", message) and self.waiting_for_locraw:  # locraw
             if "limbo" in message:  # sometimes returns limbo right when you join
@@ -351,12 +394,14 @@ class ProxyClient(Client):
                 self.waiting_for_locraw = False
                 if game.get("mode"):
                     self.rq_game.update(game)
-                    return await self._update_stats()
+                    # don't hold up the chat messages behind this one
+                    self.scope.create_task(self._update_stats())
+                    return
 
-        self.send_packet(self.client_stream, 0x02, buff.getvalue())
+        self.forward(self.client_stream, buff)
 
-    @listen_client(0x01)
-    async def packet_chat_message(self, buff: Buffer):
+    @listen_client(0x01, feature="commands")
+    async def packet_chat_message(self, buff: PacketView):
         message = buff.unpack(String)
 
         # run command
@@ -385,67 +430,48 @@ class ProxyClient(Client):
                                 self.client_stream, 0x02, Chat.pack(output), b"\x00"
                             )
             else:
-                self.send_packet(self.server_stream, 0x01, buff.getvalue())
+                self.forward(self.server_stream, buff)
         else:
-            self.send_packet(self.server_stream, 0x01, buff.getvalue())
-
-    @listen_server(0x38, blocking=True)
-    async def packet_player_list_item(self, buff: Buffer):
-        action = buff.unpack(VarInt)
-        num_players = buff.unpack(VarInt)
-
-        for _ in range(num_players):
-            _uuid = buff.unpack(UUID)
-            if action == 0:  # add player
-                name = buff.unpack(String)
-                nr_properties = buff.unpack(VarInt)
-                properties = {}
-                for _ in range(nr_properties):
-                    prop_name = buff.unpack(String)
-                    prop_value = buff.unpack(String)
-                    prop_signed = buff.unpack(Boolean)
-                    if prop_signed:
-                        prop_signature = buff.unpack(String)
-                    properties[prop_name] = (prop_value, prop_signed, prop_signature)
-
-                gamemode = buff.unpack(VarInt)
-                ping = buff.unpack(VarInt)
-                display_name = buff.unpack(Boolean)
-                if display_name:
-                    display_name = buff.unpack(Chat)
-                self.players_old[_uuid] = name
-
-                self.players[_uuid] = {
-                    "name": name,
-                    "gamemode": gamemode,
-                    "ping": ping,
-                    "display_name": display_name,
-                    "properties": properties,
+            self.forward(self.server_stream, buff)
+
+    @observe_server(0x38, feature="stats")
+    async def packet_player_list_item(self, buff: PacketView):
+        packet = packets.PlayerListItem.decode(buff.getvalue())
+
+        for player in packet.players:
+            if packet.action == 0:  # add player
+                self.players_old[player.uuid] = player.name
+                self.players[player.uuid] = {
+                    "name": player.name,
+                    "gamemode": player.gamemode,
+                    "ping": player.ping,
+                    "display_name": player.display_name,
+                    "properties": {
+                        prop.name: (
+                            prop.value,
+                            prop.signature is not None,
+                            prop.signature,
+                        )
+                        for prop in player.properties
+                    },
                 }
-            elif action == 1:  # update gamemode
-                gamemode = buff.unpack(VarInt)
-                self.players[_uuid]["gamemode"] = gamemode
-            elif action == 2:  # update latency
-                latency = buff.unpack(VarInt)
-                if _uuid in self.players:                    
-                    self.players[_uuid]["ping"] = latency
-            elif action == 3:  # update display name
-                display_name = buff.unpack(Boolean)
-                if display_name:
-                    display_name = buff.unpack(Chat)
-                self.players[_uuid]["display_name"] = display_name
-            elif action == 4:  # remove player
+            elif packet.action == 1:  # update gamemode
+                self.players[player.uuid]["gamemode"] = player.gamemode
+            elif packet.action == 2:  # update latency
+                if player.uuid in self.players:
+                    self.players[player.uuid]["ping"] = player.ping
+            elif packet.action == 3:  # update display name
+                self.players[player.uuid]["display_name"] = player.display_name
+            elif packet.action == 4:  # remove player
                 try:
-                    del self.players[_uuid]
-                    del self.players_old[_uuid]
+                    del self.players[player.uuid]
+                    del self.players_old[player.uuid]
                 except KeyError:
                     pass  # some things fail idk
 
-        self.send_packet(self.client_stream, 0x38, buff.getvalue())
-
-        if action == 0:
+        if packet.action == 0:
             # this doesn't work with await for some reason
-            asyncio.create_task(self._update_stats())
+            self.scope.create_task(self._update_stats())
 
     @command("rq")
     async def requeue(self):
@@ -496,8 +522,10 @@ class ProxyClient(Client):
         else:
             stats = tuple(Statistic(stat, gamemode) for stat in stats)
 
+        # typed by the player, so it goes ahead of tab stats
+        token = api_priority.set(INTERACTIVE)
         try:
-            player = await self.hypixel_client.player(ign)
+            player = await player_cache.player(self.hypixel_client, ign, gamemode)
         except PlayerNotFound:
             raise CommandException(f"§9§l∎ §4Player '{ign}' not found!")
         except InvalidApiKey:
@@ -511,29 +539,120 @@ class ProxyClient(Client):
                 f"§9§l∎ §4An unknown error occurred"
                 f"while fetching player '{ign}'! ({player})"
             )
+        finally:
+            api_priority.reset(token)
 
         fplayer = FormattedPlayer(player)
         return fplayer.format_stats(gamemode, *stats)
 
+    def _send_info(self, title: str, stats: dict):
+        """send a title, then each stat on its own line, in chat"""
+        self.send_packet(self.client_stream, 0x02, Chat.pack(f"§a{title}:"), b"\x00")
+        for key, value in stats.items():
+            self.send_packet(
+                self.client_stream,
+                0x02,
+                Chat.pack(f"§b{key.capitalize()}: §e{value}"),
+                b"\x00",
+            )
+
     # debug command sorta
     @command("game")
     async def _game(self):
-        self.send_packet(self.client_stream, 0x02, Chat.pack(f"§aGame:"), b"\x00")
-        for key in self.game.__annotations__:
-            if value := getattr(self.game, key):
+        stats = {key: getattr(self.game, key) for key in self.game.__annotations__}
+        self._send_info("Game", {key: value for key, value in stats.items() if value})
+
+    @command("compression")
+    async def _compression(self):
+        self._send_info("Compression", self.compression_policy.stats())
+
+    @command("offload")
+    async def _offload(self):
+        self._send_info("Offload", offloader.stats())
+
+    @command("scheduler")
+    async def _scheduler(self):
+        self._send_info("Scheduler", self.scheduler.stats())
+
+    @command("filters")
+    async def _filters(self):
+        if not filter_rules:
+            raise CommandException("§9§l∎ §4No filter rules are loaded!")
+
+        self.send_packet(self.client_stream, 0x02, Chat.pack(f"§aFilters:"), b"\x00")
+        for rule in filter_rules.values():
+            stats = ", ".join(
+                f"{key}: §e{value}§b" for key, value in rule.stats().items()
+            )
+            self.send_packet(
+                self.client_stream,
+                0x02,
+                Chat.pack(f"§b{rule.name}: {stats}"),
+                b"\x00",
+            )
+
+    @command("feature", "features")
+    async def _feature(self, name=None, state=None):
+        if name is None:
+            self.send_packet(
+                self.client_stream, 0x02, Chat.pack(f"§aFeatures:"), b"\x00"
+            )
+            for feature in sorted(features):
+                enabled = "§coff" if feature in self.disabled_features else "§aon"
                 self.send_packet(
                     self.client_stream,
                     0x02,
-                    Chat.pack(f"§b{key.capitalize()}: §e{value}"),
+                    Chat.pack(f"§b{feature}: {enabled}"),
                     b"\x00",
                 )
+            return
+
+        if name not in features:
+            raise CommandException(f"§9§l∎ §4Unknown feature '{name}'!")
+        if state is None:
+            state = "on" if name in self.disabled_features else "off"
+        elif state.lower() not in {"on", "off"}:
+            raise CommandException(
+                f"§9§l∎ §4Invalid option '{state}'. "
+                f"Please choose a correct argument! (on, off)"
+            )
+        if name == "commands" and state.lower() == "off":
+            # there'd be no command left to turn it back on with
+            raise CommandException("§9§l∎ §4Commands can't be turned off here!")
+
+        changed = self.set_feature(name, state.lower() == "on")
+        if changed:
+            return f"§aTurned {state.lower()}: §e{', '.join(sorted(changed))}"
+        return f"§e{name} §ais already {state.lower()}"
+
+    @command("tasks")
+    async def _tasks(self):
+        stats = {
+            "this connection": len(self.scope),
+            **TaskScope.stats(),
+            "handlers queued": self.executor.depth,
+            "most handlers queued": self.executor.peak_depth,
+        }
+        self._send_info("Tasks", stats)
+
+    @command("statscache")
+    async def _stats_cache(self):
+        self._send_info("Stats cache", player_cache.stats())
+
+    @command("api")
+    async def _api(self):
+        self._send_info("Hypixel API", api_scheduler.stats())
+
+    @command("http")
+    async def _http(self):
+        self._send_info("HTTP", http_pool.stats())
 
     @command("teams")
     async def _teams(self):
         print(self.teams)
 
     async def _update_stats(self):
-        if self.waiting_for_locraw:
+        if self.waiting_for_locraw or "stats" in self.disabled_features:
             return
         # update stats in tab in a game, bw & sw are supported so far
         if self.game.gametype in {"bedwars", "skywars"} and self.game.mode:
@@ -551,85 +670,107 @@ class ProxyClient(Client):
                 and player not in self.players_with_stats.keys()
                 and player not in self.players_getting_stats
             ]
+            # players looked up this session are shown straight away;
+            # the rest are looked up together, in the sqlite cache first
+            cached = {
+                player: player_cache.get(
+                    player, self.game.gametype, self.hypixel_client
+                )
+                for player in real_players
+            }
+            self._send_stats([player for player in cached.values() if player])
+            real_players = [player for player, found in cached.items() if not found]
             self.players_getting_stats.extend(real_players)
 
             player_stats = await asyncio.gather(
-                *[self.hypixel_client.player(player) for player in real_players],
+                *[
+                    player_cache.player(
+                        self.hypixel_client, player, self.game.gametype
+                    )
+                    for player in real_players
+                ],
                 return_exceptions=True,
             )
 
             for player in real_players:
                 self.players_getting_stats.remove(player)
 
-            for player in player_stats:
-                if isinstance(player, PlayerNotFound):
-                    player.name = player.player
-                    player.uuid = next(
-                        u
-                        for u, p in self.players_old.items()
-                        if p.casefold() == player.player.casefold()
-                    )
-                elif isinstance(player, InvalidApiKey):
-                    print("Invalid API Key!")  # TODO
-                    continue
-                elif isinstance(player, RateLimitError):
-                    print("Rate limit!")  # TODO
-                    continue
-                elif isinstance(player, TimeoutError):
-                    print(f"Request timed out!")  # TODO
-                    continue
-                elif not isinstance(player, hypixel.Player):
-                    print(f"An unknown error occurred! ({player})")  # TODO
-                    continue
-
-                if player.name in self.players_old.values():
-                    if not isinstance(player, PlayerNotFound):  # nick, probably
-                        fplayer = FormattedPlayer(player)
-
-                        # that red player that always shows up
-                        if red_player_team := next(
+            self._send_stats(player_stats)
+
+    def _send_stats(self, player_stats: list):
+        for player in player_stats:
+            if isinstance(player, PlayerNotFound):
+                player.name = player.player
+                player.uuid = next(
+                    u
+                    for u, p in self.players_old.items()
+                    if p.casefold() == player.player.casefold()
+                )
+            elif isinstance(player, InvalidApiKey):
+                print("Invalid API Key!")  # TODO
+                continue
+            elif isinstance(player, RateLimitError):
+                print("Rate limit!")  # TODO
+                continue
+            elif isinstance(player, TimeoutError):
+                print(f"Request timed out!")  # TODO
+                continue
+            elif not isinstance(player, hypixel.Player):
+                print(f"An unknown error occurred! ({player})")  # TODO
+                continue
+
+            if player.name in self.players_old.values():
+                if not isinstance(player, PlayerNotFound):  # nick, probably
+                    fplayer = FormattedPlayer(player)
+
+                    # that red player that always shows up
+                    if red_player_team := next(
+                        (
+                            team
+                            for team in self.teams
+                            if team.prefix == "§c"
+                            and team.name_tag_visibility == "never"
+                        ),
+                        None,
+                    ):  # shortest python if statement
+                        if (
+                            player.name in red_player_team.players
+                            and not fplayer.rank.startswith("§c")
+                        ):
+                            continue
+
+                    if self.game.gametype == "bedwars":
+                        display_name = " ".join(
                             (
-                                team
-                                for team in self.teams
-                                if team.prefix == "§c"
-                                and team.name_tag_visibility == "never"
-                            ),
-                            None,
-                        ):  # shortest python if statement
-                            if (
-                                player.name in red_player_team.players
-                                and not fplayer.rank.startswith("§c")
-                            ):
-                                continue
-
-                        if self.game.gametype == "bedwars":
-                            display_name = " ".join(
-                                (
-                                    fplayer.bedwars.level,
-                                    fplayer.rankname,
-                                    f"§f | {fplayer.bedwars.fkdr}",
-                                )
+                                fplayer.bedwars.level,
+                                fplayer.rankname,
+                                f"§f | {fplayer.bedwars.fkdr}",
                             )
-                        elif self.game.gametype == "skywars":
-                            display_name = " ".join(
-                                (
-                                    fplayer.skywars.level,
-                                    fplayer.rankname,
-                                    f"§f | {fplayer.skywars.kdr}",
-                                )
+                        )
+                    elif self.game.gametype == "skywars":
+                        display_name = " ".join(
+                            (
+                                fplayer.skywars.level,
+                                fplayer.rankname,
+                                f"§f | {fplayer.skywars.kdr}",
                             )
-                    else:
-                        display_name = f"§5[NICK] {player.name}"
+                        )
+                else:
+                    display_name = f"§5[NICK] {player.name}"
 
-                    self.send_packet(
-                        self.client_stream,
-                        0x38,
-                        VarInt.pack(3),
-                        VarInt.pack(1),
-                        UUID.pack(uuid.UUID(str(player.uuid))),
-                        Boolean.pack(True),
-                        Chat.pack(display_name),
-                    )
-                    self.players_with_stats.update(
-                        {player.name: (player.uuid, display_name)}
-                    )
+                self.send_packet(
+                    self.client_stream,
+                    0x38,
+                    *packets.PlayerListItem.pack(
+                        action=3,
+                        players=[
+                            packets.PlayerListEntry(
+                                uuid=uuid.UUID(str(player.uuid)),
+                                display_name=display_name,
+                            )
+                        ],
+                    ),
+                )
+                self.players_with_stats.update(
+                    {player.name: (player.uuid, display_name)}
+                )
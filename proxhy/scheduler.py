@@ -0,0 +1,161 @@
+import asyncio
+import socket
+import time
+from collections import Counter, deque
+
+from .encryption import Stream
+from .scope import TaskScope
+
+Frame = tuple[bytes | memoryview, ...] | asyncio.Future
+
+
+class ClientScheduler:
+    """
+    orders packets for the client once its connection backs up. game packets
+    are held back in order, and interactive packets (keep alives, chat, tab
+    list) and packets from the proxy itself go out ahead of them, unless a
+    held packet has the same id, is one they have to follow, or is a world
+    change
+    """
+
+    # packet ids that can jump the queue
+    interactive = {0x00, 0x02, 0x38}  # keep alive, chat, player list item
+    # packets nothing can be moved across: join game, respawn
+    barriers = {0x01, 0x07}
+    # packet id -> held packets it can't be moved ahead of; player list
+    # items add and remove the players spawns and teams refer to
+    follows = {0x38: {0x0C, 0x3E}}  # spawn player, teams
+    # bytes waiting for the socket from which game packets are held back;
+    # small, so a packet that jumps the queue doesn't wait behind much
+    high_water = 2**16
+    # bytes held here and buffered from which reading from the server waits
+    max_held = 2**21
+
+    def __init__(self, stream: Stream, scope: TaskScope):
+        self.stream = stream
+        self.scope = scope
+        # the transport pauses at high_water, and held packets are let out
+        # once it's down to a quarter of that
+        stream.writer.transport.set_write_buffer_limits(high=self.high_water)
+        # and the kernel keeps little unsent, so the backlog builds up here,
+        # where it can be reordered, instead of in the socket
+        sock = stream.writer.get_extra_info("socket")
+        if sock is not None and hasattr(socket, "TCP_NOTSENT_LOWAT"):
+            sock.setsockopt(
+                socket.IPPROTO_TCP, socket.TCP_NOTSENT_LOWAT, self.high_water
+            )
+
+        self._held: deque[tuple[int, str, float, Frame, int]] = deque()
+        self._held_ids: Counter[int] = Counter()
+        self._held_barriers = 0
+        self.held_bytes = 0
+        self._releasing: asyncio.Task | None = None
+        self._progress = asyncio.Event()
+
+        # packet class -> packets, held packets, seconds held, longest hold
+        self.packets: Counter[str] = Counter()
+        self.held: Counter[str] = Counter()
+        self.seconds: Counter[str] = Counter()
+        self.max_seconds: Counter[str] = Counter()
+
+    @property
+    def congested(self) -> bool:
+        """whether reading packets for the client should wait"""
+        return self.held_bytes + self.stream.buffered >= self.max_held
+
+    async def drain(self):
+        # the release task is the only one waiting on the transport
+        while self.congested and self.stream.open:
+            self._start_releasing()
+            self._progress.clear()
+            await self._progress.wait()
+
+    def write(self, packet_id: int, frame: Frame, size: int, proxy=False):
+        """send a frame, or hold it if the client is behind and it has to wait"""
+        if proxy:
+            kind = "proxy"
+        elif packet_id in self.interactive:
+            kind = "interactive"
+        else:
+            kind = "game"
+        self.packets[kind] += 1
+
+        if not self._held:
+            if self.stream.buffered <= self.high_water:
+                return self._write(frame)
+        elif (
+            kind != "game"
+            and not self._held_barriers
+            and packet_id not in self._held_ids
+            and packet_id not in self.barriers
+            and not any(self._held_ids[id] for id in self.follows.get(packet_id, ()))
+        ):
+            return self._write(frame)
+
+        self._held.append((packet_id, kind, time.perf_counter(), frame, size))
+        self._held_ids[packet_id] += 1
+        if packet_id in self.barriers:
+            self._held_barriers += 1
+        self.held_bytes += size
+        self.held[kind] += 1
+        self._start_releasing()
+
+    def _start_releasing(self):
+        if self._releasing is None and not self.scope.closed:
+            self._releasing = self.scope.create_task(self._release())
+
+    def _write(self, frame: Frame):
+        if isinstance(frame, asyncio.Future):
+            self.stream.write_later(frame)
+        else:
+            self.stream.write(*frame)
+
+    async def _release(self):
+        stream = self.stream
+        try:
+            while (self._held or self.congested) and stream.open:
+                if stream.writer.transport.get_write_buffer_size() > self.high_water:
+                    await stream.drain()
+                    continue
+
+                # top the transport up with one batch, oldest first
+                self._release_batch(self.high_water)
+                self._progress.set()
+                # let the batch be flushed before looking at the transport again
+                await asyncio.sleep(0)
+        finally:
+            self._releasing = None
+            self._progress.set()
+
+    def _release_batch(self, budget: int | float):
+        now = time.perf_counter()
+        while self._held and budget > 0:
+            packet_id, kind, queued, frame, size = self._held.popleft()
+            self._held_ids[packet_id] -= 1
+            if not self._held_ids[packet_id]:
+                del self._held_ids[packet_id]
+            if packet_id in self.barriers:
+                self._held_barriers -= 1
+            self.held_bytes -= size
+            budget -= size
+
+            delay = now - queued
+            self.seconds[kind] += delay
+            if delay > self.max_seconds[kind]:
+                self.max_seconds[kind] = delay
+            self._write(frame)
+
+    def flush(self):
+        """hand everything held to the stream, e.g. before it's closed"""
+        self._release_batch(float("inf"))
+
+    def stats(self) -> dict[str, int | float]:
+        stats = {"held KB": round(self.held_bytes / 1000, 1)}
+        for kind in ("game", "interactive", "proxy"):
+            stats[f"{kind} packets"] = self.packets[kind]
+            stats[f"{kind} held"] = self.held[kind]
+            if self.held[kind]:
+                mean = self.seconds[kind] / self.held[kind]
+                stats[f"{kind} mean ms held"] = round(mean * 1000, 2)
+                stats[f"{kind} max ms held"] = round(self.max_seconds[kind] * 1000, 2)
+        return stats
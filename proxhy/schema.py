@@ -0,0 +1,256 @@
+"""
+declarative packet layouts, compiled into one specialized decode and encode
+function per packet instead of decoding field by field through Buffer.unpack
+"""
+
+import uuid
+from collections import namedtuple
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from .datatypes import UUID, Boolean, DataType, String, UnsignedByte, VarInt
+
+
+class Field:
+    def __init__(self, name: str, kind):
+        self.name = name
+        self.kind = kind
+
+
+class When:
+    """fields that are only present if an earlier field has one of the given values"""
+
+    def __init__(self, field: str, values: Iterable, *fields: "Field | When"):
+        self.field = field
+        self.values = frozenset(values)
+        self.fields = fields
+
+
+class Option:
+    """a Boolean followed by the value if it's true; None if it's missing"""
+
+    def __init__(self, kind):
+        self.kind = kind
+
+
+class Array:
+    """a list of kind, prefixed with its length"""
+
+    def __init__(self, kind, count: type[DataType[int]] = VarInt):
+        self.kind = kind
+        self.count = count
+
+
+class Record:
+    """
+    a group of fields, decoded into a namedtuple; fields that aren't present
+    are None. conditions in nested records can refer to fields of their parents
+    """
+
+    def __init__(self, name: str, *fields: Field | When):
+        self.name = name
+        self.fields = fields
+
+        names = []
+        for field in _flatten(fields):
+            if field.name not in names:  # same field in exclusive branches
+                names.append(field.name)
+        self.type = namedtuple(name, names, defaults=(None,) * len(names))
+
+    def __call__(self, **values):
+        return self.type(**values)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.name}>"
+
+
+class Packet(Record):
+    def __init__(self, packet_id: int, name: str, *fields: Field | When):
+        super().__init__(name, *fields)
+        self.id = packet_id
+
+        compiler = _Compiler()
+        self.decode: Callable[..., Any] = compiler.decoder(self)
+        self.encode: Callable[[Any], list[bytes]] = compiler.encoder(self)
+        self.source = "\n".join(compiler.source)
+
+    def pack(self, **values) -> list[bytes]:
+        """encode a packet from keyword arguments, for send_packet(..., *parts)"""
+        return self.encode(self.type(**values))
+
+
+def _flatten(fields) -> Iterable[Field]:
+    for field in fields:
+        if isinstance(field, When):
+            yield from _flatten(field.fields)
+        else:
+            yield field
+
+
+class _Compiler:
+    def __init__(self):
+        self.namespace: dict[str, Any] = {}
+        self.source: list[str] = []
+        self._counter = 0
+
+    def _var(self) -> str:
+        self._counter += 1
+        return f"_{self._counter}"
+
+    def _ref(self, obj) -> str:
+        """name under which obj is reachable from the generated code"""
+        name = self._var()
+        self.namespace[name] = obj
+        return name
+
+    def _build(self, name: str, lines: list[str]):
+        source = "\n".join(lines)
+        self.source.append(source)
+        exec(compile(source, f"<{name}>", "exec"), self.namespace)
+        return self.namespace[name]
+
+    # decoding
+    def decoder(self, packet: Packet):
+        lines = ["def decode(data, offset=0):"]
+        result = self._decode_record(packet, lines, 1, {})
+        lines.append(f"    return {result}")
+        return self._build("decode", lines)
+
+    def _decode_record(self, record: Record, lines, depth, scope) -> str:
+        indent = "    " * depth
+        scope = dict(scope)  # children see their parents' fields, not the reverse
+
+        variables = {}
+        for field in _flatten(record.fields):
+            variables.setdefault(field.name, self._var())
+        scope.update(variables)
+        lines.append(f"{indent}{' = '.join(variables.values())} = None")
+
+        self._decode_fields(record.fields, lines, depth, scope)
+
+        result = self._var()
+        lines.append(
+            f"{indent}{result} = {self._ref(record.type)}"
+            f"({', '.join(variables.values())})"
+        )
+        return result
+
+    def _decode_fields(self, fields, lines, depth, scope):
+        indent = "    " * depth
+        for field in fields:
+            if isinstance(field, When):
+                lines.append(
+                    f"{indent}if {scope[field.field]} in {self._ref(field.values)}:"
+                )
+                self._decode_fields(field.fields, lines, depth + 1, scope)
+            else:
+                self._decode_kind(field.kind, scope[field.name], lines, depth, scope)
+
+    def _decode_kind(self, kind, target: str, lines, depth, scope):
+        indent = "    " * depth
+        if isinstance(kind, Option):
+            lines.append(f"{indent}offset += 1")
+            lines.append(f"{indent}if data[offset - 1]:")
+            self._decode_kind(kind.kind, target, lines, depth + 1, scope)
+            lines.append(f"{indent}else:")
+            lines.append(f"{indent}    {target} = None")
+        elif isinstance(kind, Array):
+            count, item = self._var(), self._var()
+            lines.append(
+                f"{indent}{count}, offset = {self._ref(kind.count.unpack_from)}"
+                "(data, offset)"
+            )
+            lines.append(f"{indent}{target} = []")
+            lines.append(f"{indent}for _ in range({count}):")
+            self._decode_kind(kind.kind, item, lines, depth + 1, scope)
+            lines.append(f"{indent}    {target}.append({item})")
+        elif isinstance(kind, Record):
+            result = self._decode_record(kind, lines, depth, scope)
+            lines.append(f"{indent}{target} = {result}")
+        elif kind is VarInt:
+            # nearly every varint in a packet is a single byte
+            lines.append(f"{indent}{target} = data[offset]")
+            lines.append(f"{indent}if {target} < 0x80:")
+            lines.append(f"{indent}    offset += 1")
+            lines.append(f"{indent}else:")
+            lines.append(
+                f"{indent}    {target}, offset = {self._ref(VarInt.unpack_from)}"
+                "(data, offset)"
+            )
+        elif kind is String:
+            length = self._var()
+            self._decode_kind(VarInt, length, lines, depth, scope)
+            lines.append(
+                f'{indent}{target} = str(data[offset : offset + {length}], "utf-8")'
+            )
+            lines.append(f"{indent}offset += {length}")
+        elif kind is UnsignedByte or kind is Boolean:
+            comparison = " != 0" if kind is Boolean else ""
+            lines.append(f"{indent}{target} = data[offset]{comparison}")
+            lines.append(f"{indent}offset += 1")
+        elif kind is UUID:
+            lines.append(
+                f"{indent}{target} = {self._ref(uuid.UUID)}"
+                "(bytes=bytes(data[offset : offset + 16]))"
+            )
+            lines.append(f"{indent}offset += 16")
+        else:
+            lines.append(
+                f"{indent}{target}, offset = {self._ref(kind.unpack_from)}"
+                "(data, offset)"
+            )
+
+    # encoding
+    def encoder(self, packet: Packet):
+        lines = [
+            "def encode(record):",
+            "    parts = []",
+            "    append = parts.append",
+        ]
+        self._encode_record(packet, "record", lines, 1, {})
+        lines.append("    return parts")
+        return self._build("encode", lines)
+
+    def _encode_record(self, record: Record, source: str, lines, depth, scope):
+        indent = "    " * depth
+        scope = dict(scope)
+
+        for field in _flatten(record.fields):
+            if field.name not in scope or scope[field.name][0] is not record:
+                variable = self._var()
+                lines.append(f"{indent}{variable} = {source}.{field.name}")
+                scope[field.name] = (record, variable)
+
+        self._encode_fields(record.fields, lines, depth, scope)
+
+    def _encode_fields(self, fields, lines, depth, scope):
+        indent = "    " * depth
+        for field in fields:
+            if isinstance(field, When):
+                lines.append(
+                    f"{indent}if {scope[field.field][1]} in "
+                    f"{self._ref(field.values)}:"
+                )
+                self._encode_fields(field.fields, lines, depth + 1, scope)
+            else:
+                self._encode_kind(field.kind, scope[field.name][1], lines, depth, scope)
+
+    def _encode_kind(self, kind, source: str, lines, depth, scope):
+        indent = "    " * depth
+        if isinstance(kind, Option):
+            lines.append(f"{indent}if {source} is None:")
+            lines.append(f'{indent}    append(b"\\x00")')
+            lines.append(f"{indent}else:")
+            lines.append(f'{indent}    append(b"\\x01")')
+            self._encode_kind(kind.kind, source, lines, depth + 1, scope)
+        elif isinstance(kind, Array):
+            item = self._var()
+            lines.append(f"{indent}append({self._ref(kind.count.pack)}(len({source})))")
+            lines.append(f"{indent}for {item} in {source}:")
+            self._encode_kind(kind.kind, item, lines, depth + 1, scope)
+        elif isinstance(kind, Record):
+            self._encode_record(kind, source, lines, depth, scope)
+        elif kind is UUID:
+            lines.append(f"{indent}append({source}.bytes)")
+        else:
+            lines.append(f"{indent}append({self._ref(kind.pack)}({source}))")
@@ -0,0 +1,60 @@
+import asyncio
+from collections.abc import Coroutine
+
+
+class TaskScope:
+    """
+    the tasks one connection has started, on whichever loop, cancelled
+    together when it closes. open scopes are counted so leaks show up
+    """
+
+    # scopes that haven't been closed, i.e. live connections
+    live: set["TaskScope"] = set()
+
+    def __init__(self):
+        self.closed = False
+        self._tasks: set[asyncio.Task] = set()
+        TaskScope.live.add(self)
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def create_task(self, coro: Coroutine) -> asyncio.Task:
+        """start coro on the running loop; it's cancelled if the scope closes"""
+        if self.closed:
+            coro.close()
+            raise RuntimeError("task scope is closed")
+
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def close(self) -> None:
+        """cancel every task but the one closing the scope; safe to call again"""
+        if self.closed:
+            return
+        self.closed = True
+        TaskScope.live.discard(self)
+
+        try:
+            current = asyncio.current_task()
+        except RuntimeError:  # no running loop
+            current = None
+        loop = current.get_loop() if current else None
+
+        for task in list(self._tasks):
+            if task is current:
+                continue
+            if task.get_loop() is loop:
+                task.cancel()
+            else:  # started on the other thread's loop
+                task.get_loop().call_soon_threadsafe(task.cancel)
+
+    @classmethod
+    def stats(cls) -> dict[str, int]:
+        scopes = list(cls.live)
+        return {
+            "connections": len(scopes),
+            "tasks": sum(len(scope) for scope in scopes),
+        }
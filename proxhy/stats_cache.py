@@ -0,0 +1,334 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import hypixel
+from appdirs import user_cache_dir
+from hypixel.errors import PlayerNotFound
+from hypixel.models.player import aliases
+from hypixel.utils import _clean
+
+# fields of the player, outside of stats, that hypixel.Player and
+# FormattedPlayer read (name, rank, level)
+PLAYER_FIELDS = {
+    "_id",
+    "uuid",
+    "displayname",
+    "firstLogin",
+    "lastLogin",
+    "lastLogout",
+    "networkExp",
+    "karma",
+    "achievementPoints",
+    "prefix",
+    "rank",
+    "packageRank",
+    "newPackageRank",
+    "monthlyPackageRank",
+    "rankPlusColor",
+    "monthlyRankColor",
+    "mostRecentGameType",
+}
+
+
+def _mode_fields(prefix: str) -> set[str]:
+    """the api fields hypixel.py reads for a gamemode and its submodes"""
+    names = (name for name in aliases.__all__ if name.startswith(prefix))
+    # _data is hypixel.py's own copy of the stats, not a field
+    return set().union(*(getattr(aliases, name) for name in names)) - {"_data"}
+
+
+# gamemode -> (its key in stats, the stat fields kept for it)
+MODE_STATS = {
+    "bedwars": ("Bedwars", _mode_fields("BEDWARS")),
+    "skywars": ("SkyWars", _mode_fields("SKYWARS") | {"selected_prestige_icon"}),
+}
+
+# (time fetched, player, or None if they weren't found)
+Entry = tuple[float, hypixel.Player | None]
+
+
+class StatsCache:
+    """
+    players' stats from earlier lookups, kept in an sqlite file in the cache
+    directory so they last between sessions. only the fields tab stats and
+    /sc render are kept. reads and writes are made off the loop, and writes
+    are batched
+    """
+
+    # seconds puts are collected for before they're written together
+    write_delay = 2.0
+
+    def __init__(self, path: Path | str | None = None):
+        self.path = path
+        self._db: sqlite3.Connection | None = None
+        self._lock = threading.Lock()  # for the connection
+        self._pending_lock = threading.Lock()
+        # uuid -> (name, time fetched, data) for puts not written yet
+        self._pending: dict[str, tuple[str, float, str]] = {}
+        self._writing = False
+
+        self.reads = 0
+        self.found = 0
+        self.writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # opened on first use, so forked workers each open their own
+        if self._db is None:
+            if self.path is None:
+                cache_dir = Path(user_cache_dir("proxhy"))
+                cache_dir.mkdir(parents=True, exist_ok=True)
+                self.path = cache_dir / "stats.db"
+            db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS players "
+                "(uuid TEXT PRIMARY KEY, name TEXT, fetched REAL, data TEXT)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS players_name ON players (name)")
+            db.commit()
+            self._db = db
+        return self._db
+
+    async def load(self, name: str) -> tuple[float, hypixel.Player] | None:
+        """get, in the default executor"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, name)
+
+    def get(self, name: str) -> tuple[float, hypixel.Player] | None:
+        """when the player was last looked up, and what was found; blocks"""
+        name = name.casefold()
+        with self._pending_lock:
+            row = next(
+                (row[1:] for row in self._pending.values() if row[0] == name), None
+            )
+        if row is None:
+            with self._lock:
+                row = (
+                    self._connect()
+                    .execute(
+                        "SELECT fetched, data FROM players WHERE name = ? "
+                        "ORDER BY fetched DESC LIMIT 1",
+                        (name,),
+                    )
+                    .fetchone()
+                )
+
+        self.reads += 1
+        if row is None:
+            return None
+        self.found += 1
+        fetched, data = row
+        return fetched, player_from_data(json.loads(data))
+
+    def put(self, player: hypixel.Player):
+        """keep the player's stats; written with the next batch"""
+        data = json.dumps(data_from_player(player), separators=(",", ":"))
+        with self._pending_lock:
+            self._pending[player.uuid] = (player.name.casefold(), time.time(), data)
+            if self._writing:
+                return
+            self._writing = True
+        asyncio.get_running_loop().call_later(self.write_delay, self._write_later)
+
+    def _write_later(self):
+        asyncio.get_running_loop().run_in_executor(None, self.flush)
+
+    def flush(self):
+        """write every pending put; blocks, and is called on shutdown"""
+        with self._pending_lock:
+            self._writing = False
+            pending = dict(self._pending)
+        if not pending:
+            return
+
+        rows = [(uuid, *row) for uuid, row in pending.items()]
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO players VALUES (?, ?, ?, ?)", rows
+                )
+        self.writes += 1
+
+        # until now, gets found them here; puts made since are kept
+        with self._pending_lock:
+            for uuid, row in pending.items():
+                if self._pending.get(uuid) is row:
+                    del self._pending[uuid]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "disk reads": self.reads,
+            "found on disk": self.found,
+            "batches written": self.writes,
+        }
+
+
+class PlayerCache:
+    """
+    hypixel lookups for the whole process, in front of every connection's
+    client. concurrent lookups of a player share one request, players that
+    don't exist (nicks) are remembered for a little while, and stats past
+    their ttl are still shown while they're looked up again in the
+    background. the least recently used are dropped past max_size, and
+    misses are looked for in the store (the sqlite cache), off the loop,
+    before the api
+    """
+
+    # gamemode -> seconds a lookup is good for; stats change faster in
+    # modes with shorter games
+    ttl = {"bedwars": 30 * 60, "skywars": 30 * 60}
+    default_ttl = 10 * 60
+    # seconds past its ttl a lookup is still shown while it's refreshed
+    stale_ttl = 60 * 60
+    # seconds a player that wasn't found is remembered for
+    not_found_ttl = 2 * 60
+    max_size = 4096
+
+    def __init__(self, store: StatsCache):
+        self.store = store
+        self._entries: OrderedDict[str, Entry] = OrderedDict()
+        # name -> the lookup in flight, shared by everyone waiting on it
+        self._lookups: dict[str, asyncio.Task] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.not_found_hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+
+    def get(
+        self, name: str, gamemode: str | None = None, client=None
+    ) -> hypixel.Player | PlayerNotFound | None:
+        """
+        what's known about the player without waiting: them, PlayerNotFound
+        if they don't exist, or None. only what's in memory is looked at.
+        stale stats are refreshed with client
+        """
+        key = name.casefold()
+        if (entry := self._entries.get(key)) is None:
+            return None
+        self._entries.move_to_end(key)
+
+        fetched, player = entry
+        age = time.time() - fetched
+        if player is None:
+            if age < self.not_found_ttl:
+                self.not_found_hits += 1
+                return PlayerNotFound(name)
+            return None
+
+        ttl = self.ttl.get(gamemode, self.default_ttl)
+        if age < ttl:
+            self.hits += 1
+            return player
+        if age < ttl + self.stale_ttl and client is not None:
+            self.stale_hits += 1
+            self._look_up(client, name)
+            return player
+        return None
+
+    async def player(
+        self, client: hypixel.Client, name: str, gamemode: str | None = None
+    ) -> hypixel.Player:
+        """like client.player(name), from the cache if it can be"""
+        player = self.get(name, gamemode, client)
+        key = name.casefold()
+        if player is None and key not in self._entries:
+            entry = await self.store.load(key)
+            # unless it was looked up while the store was read
+            if entry is not None and key not in self._entries:
+                self._add(key, entry)
+            player = self.get(name, gamemode, client)
+        if isinstance(player, PlayerNotFound):
+            raise player
+        if player is not None:
+            return player
+
+        self.misses += 1
+        # shielded, so a caller giving up doesn't cancel it for the others
+        return await asyncio.shield(self._look_up(client, name))
+
+    def _look_up(self, client: hypixel.Client, name: str) -> asyncio.Task:
+        key = name.casefold()
+        if (lookup := self._lookups.get(key)) is not None:
+            self.shared += 1
+            return lookup
+
+        lookup = asyncio.ensure_future(self._fetch(client, name))
+        self._lookups[key] = lookup
+        lookup.add_done_callback(lambda _: self._lookups.pop(key, None))
+        # refreshes in the background have no one to raise to
+        lookup.add_done_callback(
+            lambda lookup: lookup.cancelled() or lookup.exception()
+        )
+        return lookup
+
+    async def _fetch(self, client: hypixel.Client, name: str) -> hypixel.Player:
+        try:
+            player = await client.player(name)
+        except PlayerNotFound:
+            self._add(name.casefold(), (time.time(), None))
+            raise
+        self._add(name.casefold(), (time.time(), player))
+        self.store.put(player)
+        return player
+
+    def _add(self, key: str, entry: Entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "players": len(self._entries),
+            "hits": self.hits,
+            "stale hits": self.stale_hits,
+            "not found hits": self.not_found_hits,
+            "misses": self.misses,
+            "shared lookups": self.shared,
+            "evictions": self.evictions,
+            **self.store.stats(),
+        }
+
+
+def data_from_player(player: hypixel.Player) -> dict:
+    """the parts of the player's api data that are rendered"""
+    raw = player.raw["player"]
+    data = {key: value for key, value in raw.items() if key in PLAYER_FIELDS}
+    # hypixel.Player renames achievements, and only the bedwars level is read
+    achievements = raw.get("achievement_stats", {})
+    if "bedwars_level" in achievements:
+        data["achievements"] = {"bedwars_level": achievements["bedwars_level"]}
+
+    stats = raw.get("stats", {})
+    data["stats"] = {
+        key: {field: value for field, value in stats[key].items() if field in fields}
+        for key, fields in MODE_STATS.values()
+        if key in stats
+    }
+    return data
+
+
+def player_from_data(data: dict) -> hypixel.Player:
+    """
+    a player like hypixel.Client.player returns, from data_from_player. this
+    is built the way hypixel.py builds it, which isn't public, so hypixel.py
+    is pinned to the version tests/test_stats_cache.py passes with
+    """
+    return hypixel.Player(
+        raw={"player": data}, _data=data, **_clean(data, mode="PLAYER")
+    )
+
+
+# player_cache is only used on the loop handlers run on, since its lookups in
+# flight are tasks there; the store is locked, so any thread can use it
+stats_cache = StatsCache()
+player_cache = PlayerCache(stats_cache)
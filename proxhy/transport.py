@@ -0,0 +1,166 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+
+
+class BufferedStream(asyncio.BufferedProtocol):
+    """
+    Reader and writer in one; the socket receives straight into a preallocated
+    buffer instead of going through StreamReader's buffer and per-read copies
+    """
+
+    buffer_size = 2**18
+    min_free = 2**14  # stop reading from the socket below this much free space
+
+    def __init__(
+        self, client_connected_cb: Callable[..., Awaitable | None] | None = None
+    ):
+        self._client_connected_cb = client_connected_cb
+        self._loop = asyncio.get_running_loop()
+
+        self._buffer = bytearray(self.buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+        self._eof = False
+        self._reading_paused = False
+        self._read_waiter: asyncio.Future | None = None
+
+        self._writing_paused = False
+        self._drain_waiter: asyncio.Future | None = None
+        self._closed = self._loop.create_future()
+
+        self.transport: asyncio.Transport | None = None
+
+    # protocol callbacks
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+        if self._client_connected_cb:
+            result = self._client_connected_cb(self, self)
+            if asyncio.iscoroutine(result):
+                self._loop.create_task(result)
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif len(self._buffer) - self._end < self.min_free:
+            # move unread bytes to the front
+            size = self._end - self._start
+            self._view[:size] = self._view[self._start : self._end]  # a memmove
+            self._start, self._end = 0, size
+
+        if self._end == len(self._buffer):
+            self._buffer = self._buffer + bytes(len(self._buffer))
+            self._view = memoryview(self._buffer)
+
+        return self._view[self._end :]
+
+    def buffer_updated(self, nbytes: int):
+        self._end += nbytes
+        if len(self._buffer) - (self._end - self._start) < self.min_free:
+            self._reading_paused = True
+            self.transport.pause_reading()
+        self._wake_reader()
+
+    def eof_received(self) -> bool:
+        self._eof = True
+        self._wake_reader()
+        return False
+
+    def connection_lost(self, exc: Exception | None):
+        self._eof = True
+        self._wake_reader()
+        self.resume_writing()
+        if not self._closed.done():
+            self._closed.set_result(None)
+
+    def pause_writing(self):
+        self._writing_paused = True
+
+    def resume_writing(self):
+        self._writing_paused = False
+        if self._drain_waiter and not self._drain_waiter.done():
+            self._drain_waiter.set_result(None)
+
+    def _wake_reader(self):
+        if self._read_waiter and not self._read_waiter.done():
+            self._read_waiter.set_result(None)
+
+    # reader api
+    async def read(self, n: int = -1) -> bytes:
+        return bytes(await self.read_view(n))
+
+    async def read_view(self, n: int = -1) -> memoryview:
+        """
+        like read, but a view of the buffer instead of a copy. it's only good
+        until the next await, when more can be received into the buffer
+        """
+        while self._start == self._end:
+            if self._eof:
+                return self._view[:0]
+            self._read_waiter = self._loop.create_future()
+            try:
+                await self._read_waiter
+            finally:
+                self._read_waiter = None
+
+        end = self._end if n < 0 else min(self._end, self._start + n)
+        data = self._view[self._start : end]
+        self._start = end
+
+        if self._reading_paused and not self._eof:
+            self._reading_paused = False
+            self.transport.resume_reading()
+        return data
+
+    # writer api
+    def write(self, data):
+        self.transport.write(data)
+
+    def writelines(self, data):
+        self.transport.writelines(data)
+
+    async def drain(self):
+        if self.transport.is_closing():
+            # let connection_lost run, like StreamWriter does
+            await asyncio.sleep(0)
+        if self._writing_paused:
+            self._drain_waiter = self._loop.create_future()
+            try:
+                await self._drain_waiter
+            finally:
+                self._drain_waiter = None
+
+    def get_extra_info(self, name, default=None):
+        return self.transport.get_extra_info(name, default)
+
+    def is_closing(self) -> bool:
+        return self.transport.is_closing()
+
+    def close(self):
+        return self.transport.close()
+
+    async def wait_closed(self):
+        await self._closed
+
+
+async def start_server(
+    client_connected_cb: Callable[..., Awaitable | None],
+    host: str | None = None,
+    port: int | None = None,
+    **kwds,
+) -> asyncio.Server:
+    """like asyncio.start_server, but the callback gets BufferedStreams"""
+    loop = asyncio.get_running_loop()
+    return await loop.create_server(
+        lambda: BufferedStream(client_connected_cb), host, port, **kwds
+    )
+
+
+async def open_connection(
+    host: str | None = None, port: int | None = None, **kwds
+) -> tuple[BufferedStream, BufferedStream]:
+    """like asyncio.open_connection, but returns a BufferedStream as reader & writer"""
+    loop = asyncio.get_running_loop()
+    _, protocol = await loop.create_connection(BufferedStream, host, port, **kwds)
+    return protocol, protocol
@@ -0,0 +1,153 @@
+import asyncio
+import unittest
+import uuid
+
+from proxhy.datatypes import (
+    UUID,
+    Boolean,
+    Buffer,
+    Byte,
+    ByteArray,
+    Chat,
+    Long,
+    PacketView,
+    Short,
+    String,
+    UnsignedByte,
+    UnsignedShort,
+    VarInt,
+)
+
+# (type, values) round tripped through pack, unpack and unpack_from
+CASES = [
+    (
+        VarInt,
+        [0, 1, 127, 128, 255, 300, 2**14 - 1, 2**14, 2**21, 2**28, 2**31 - 1]
+        + [-1, -2, -300, -(2**31)],
+    ),
+    (String, ["", "hello", "§a∎ ünïcødé 🎉", "x" * 300, "∎" * 5000]),
+    (UnsignedShort, [0, 1, 25565, 2**16 - 1]),
+    (Short, [0, 1, -1, 2**15 - 1, -(2**15)]),
+    (Long, [0, 1, -1, 2**63 - 1, -(2**63)]),
+    (Byte, [b"\x00", b"\x7f", b"\xff"]),
+    (UnsignedByte, [0, 127, 255]),
+    (ByteArray, [b"", b"\x00", bytes(range(256)), bytes(20000)]),
+    (Chat, ["", "hello", "∎ ünïcødé 🎉"]),
+    (UUID, [uuid.UUID(int=0), uuid.UUID(int=2**128 - 1), uuid.uuid4()]),
+    (Boolean, [True, False]),
+]
+
+
+class TestRoundTrip(unittest.TestCase):
+    def test_unpack(self):
+        for kind, values in CASES:
+            for value in values:
+                with self.subTest(kind=kind.__name__, value=value):
+                    buff = Buffer(kind.pack(value))
+                    self.assertEqual(kind.unpack(buff), value)
+                    self.assertEqual(buff.read(), b"")  # all of it was read
+
+    def test_unpack_from(self):
+        for kind, values in CASES:
+            for value in values:
+                with self.subTest(kind=kind.__name__, value=value):
+                    packed = kind.pack(value)
+                    # with bytes around it, from both bytes and a memoryview
+                    data = b"\xaa\xbb" + packed + b"\xcc"
+                    for source in data, memoryview(data):
+                        self.assertEqual(
+                            kind.unpack_from(source, 2), (value, 2 + len(packed))
+                        )
+
+    def test_constructor(self):
+        for kind, values in CASES:
+            for value in values:
+                if isinstance(value, bytes):
+                    continue  # bytes are taken to be packed
+                with self.subTest(kind=kind.__name__, value=value):
+                    packed = kind.pack(value)
+                    self.assertEqual(kind(value).packed, packed)
+                    self.assertEqual(kind(packed).value, value)
+
+
+class TestVarInt(unittest.TestCase):
+    def test_encodings(self):
+        for value, packed in [
+            (0, b"\x00"),
+            (127, b"\x7f"),
+            (128, b"\x80\x01"),
+            (300, b"\xac\x02"),
+            (2**14, b"\x80\x80\x01"),
+            (2**31 - 1, b"\xff\xff\xff\xff\x07"),
+            (-1, b"\xff\xff\xff\xff\x0f"),
+            (-(2**31), b"\x80\x80\x80\x80\x08"),
+        ]:
+            with self.subTest(value=value):
+                self.assertEqual(VarInt.pack(value), packed)
+
+    def test_sizes(self):
+        # in and past the precomputed one and two byte table
+        for value in range(-300, 70000):
+            packed = VarInt.pack(value)
+            self.assertEqual(VarInt.unpack(Buffer(packed)), value)
+            self.assertEqual(VarInt.unpack_from(packed), (value, len(packed)))
+        # negative values always take five bytes
+        self.assertEqual(len(VarInt.pack(-1)), 5)
+        self.assertEqual(len(VarInt.pack(2**28)), 5)
+
+    def test_unpack_stream(self):
+        class Reader:
+            def __init__(self, data: bytes):
+                self.buff = Buffer(data)
+
+            async def read(self, n: int) -> bytes:
+                return self.buff.read(n)
+
+        async def unpack(data: bytes) -> int:
+            return await VarInt.unpack_stream(Reader(data))
+
+        for value in 0, 300, 2**31 - 1, -1:
+            with self.subTest(value=value):
+                self.assertEqual(asyncio.run(unpack(VarInt.pack(value))), value)
+
+
+class TestString(unittest.TestCase):
+    def test_length_is_in_bytes(self):
+        packed = String.pack("∎")
+        self.assertEqual(packed, b"\x03\xe2\x88\x8e")
+
+    def test_long_length(self):
+        # the length takes two bytes past 127
+        packed = String.pack("∎" * 50)
+        self.assertEqual(packed[:2], VarInt.pack(150))
+
+
+class TestChat(unittest.TestCase):
+    def test_parse(self):
+        text = (
+            '{"text": "§ahello ", "extra": [{"text": "§bworld"}, "!"],'
+            ' "translate": "chat.type", "with": ["a", {"text": "b"}]}'
+        )
+        data = String.pack(text)
+        self.assertEqual(Chat.unpack(Buffer(data)), "chat.type{a, b}hello world!")
+        self.assertEqual(
+            Chat.unpack_from(data), ("chat.type{a, b}hello world!", len(data))
+        )
+
+
+class TestPacketView(unittest.TestCase):
+    def test_fields(self):
+        payload = VarInt.pack(-1) + String.pack("∎ hi") + Long.pack(2**40) + b"rest"
+        packet = VarInt.pack(0x38) + payload
+        buff = PacketView(packet, 0x38, 1)
+
+        self.assertEqual(buff.unpack(VarInt), -1)
+        self.assertEqual(buff.unpack(String), "∎ hi")
+        self.assertEqual(buff.unpack(Long), 2**40)
+        self.assertEqual(buff.tell(), len(payload) - 4)
+        self.assertEqual(buff.read(), b"rest")
+        self.assertEqual(bytes(buff.getvalue()), payload)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import asyncio
+import time
+import unittest
+
+from proxhy.executor import HandlerExecutor, ThreadedExecutor
+from proxhy.feature_loop import FeatureLoop
+
+
+class TestHandlerExecutor(unittest.IsolatedAsyncioTestCase):
+    workers = 4
+
+    def executor(self) -> HandlerExecutor:
+        return HandlerExecutor(self.workers, 1024)
+
+    async def asyncSetUp(self):
+        self.release = asyncio.Event()
+        self.ran: list[tuple[str, int]] = []
+
+    async def slow(self, i: int):
+        self.ran.append(("slow", i))
+        # set from this loop, whichever loop the handler runs on
+        while not self.release.is_set():
+            await asyncio.sleep(0.005)
+
+    async def quick(self, i: int):
+        self.ran.append(("quick", i))
+
+    async def wait_for(self, condition, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail(f"timed out; ran {self.ran}")
+            await asyncio.sleep(0.005)
+
+    async def test_saturated_handler_doesnt_block_others(self):
+        executor = self.executor()
+        # more calls of a handler limited to one at a time than there are
+        # workers, then a call of another handler
+        for i in range(self.workers + 1):
+            await executor.submit(self.slow, i)
+        await executor.submit(self.quick, 0)
+
+        await self.wait_for(lambda: ("quick", 0) in self.ran)
+        self.assertEqual(self.ran.count(("slow", 0)), 1)
+        self.assertNotIn(("slow", 1), self.ran)  # still waiting its turn
+
+        self.release.set()
+        await self.wait_for(lambda: len(self.ran) == self.workers + 2)
+        slow = [i for name, i in self.ran if name == "slow"]
+        self.assertEqual(slow, list(range(self.workers + 1)))  # in order
+        self.assertEqual(executor.depth, 0)
+        executor.close()
+
+    async def test_limit(self):
+        executor = self.executor()
+        executor.limits[self.slow] = 2
+        for i in range(3):
+            await executor.submit(self.slow, i)
+
+        await self.wait_for(lambda: len(self.ran) == 2)
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.ran, [("slow", 0), ("slow", 1)])
+        self.assertEqual(executor.depth, 1)
+
+        self.release.set()
+        await self.wait_for(lambda: len(self.ran) == 3)
+        executor.close()
+
+
+# handlers run on this loop's thread
+feature_loop = FeatureLoop("test-features")
+
+
+class TestThreadedExecutor(TestHandlerExecutor):
+    def executor(self) -> HandlerExecutor:
+        return ThreadedExecutor(feature_loop.get(), self.workers, 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
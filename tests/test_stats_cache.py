@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+
+import hypixel
+
+from proxhy.formatting import FormattedPlayer
+from proxhy.stats_cache import StatsCache, data_from_player, player_from_data
+
+UUID = "0123456789abcdef0123456789abcdef"
+
+# what the api sends, with fields that aren't rendered
+RESPONSE = {
+    "success": True,
+    "player": {
+        "uuid": UUID,
+        "displayname": "Perlence",
+        "newPackageRank": "MVP_PLUS",
+        "rankPlusColor": "GOLD",
+        "networkExp": 1234567,
+        "karma": 1000,
+        "firstLogin": 1500000000000,
+        "lastLogin": 1700000000000,
+        "achievements": {"bedwars_level": 312, "general_wins": 5},
+        "stats": {
+            "Bedwars": {
+                "Experience": 1234567,
+                "final_kills_bedwars": 4321,
+                "final_deaths_bedwars": 987,
+                "wins_bedwars": 1500,
+                "losses_bedwars": 600,
+                "eight_one_wins_bedwars": 100,
+                "coins": 99999,
+            },
+            "SkyWars": {
+                "skywars_experience": 54321,
+                "kills": 6000,
+                "deaths": 2500,
+                "wins": 900,
+                "losses": 1000,
+                "selected_prestige_icon": "default",
+            },
+            "Duels": {"wins": 10},
+        },
+        "socialMedia": {"links": {"DISCORD": "x"}},
+    },
+}
+
+STATS = {
+    "bedwars": ("Finals", "FKDR", "Wins", "WLR"),
+    "skywars": ("Kills", "KDR", "Wins", "WLR"),
+}
+
+
+class Client(hypixel.Client):
+    """answers every request with RESPONSE"""
+
+    async def _get(self, path, params=None, key_required=True):
+        return {**RESPONSE, "player": dict(RESPONSE["player"])}
+
+
+class TestRoundTrip(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        client = Client("key")
+        try:
+            # built by hypixel.py, the way a lookup builds it
+            self.player = await client.player(UUID)
+        finally:
+            await client.close()
+
+    def assertRendersAlike(self, player: hypixel.Player, cached: hypixel.Player):
+        self.assertEqual(cached.name, player.name)
+        self.assertEqual(cached.uuid, player.uuid)
+        self.assertEqual(cached.rank, player.rank)
+        for mode, stats in STATS.items():
+            with self.subTest(mode=mode):
+                self.assertEqual(
+                    FormattedPlayer(cached).format_stats(mode, *stats),
+                    FormattedPlayer(player).format_stats(mode, *stats),
+                )
+
+    def test_data(self):
+        cached = player_from_data(data_from_player(self.player))
+        self.assertRendersAlike(self.player, cached)
+
+        data = data_from_player(cached)  # again, from a cached player
+        self.assertNotIn("socialMedia", data)
+        self.assertEqual(set(data["stats"]), {"Bedwars", "SkyWars"})
+        self.assertRendersAlike(self.player, player_from_data(data))
+
+    async def test_store(self):
+        path = os.path.join(tempfile.mkdtemp(), "stats.db")
+        writer = StatsCache(path)
+        writer.put(self.player)
+        self.assertIsNone(StatsCache(path).get("Perlence"))  # not written yet
+        writer.flush()
+
+        # read back from disk by another process's cache
+        fetched, cached = await StatsCache(path).load("perlence")
+        self.assertRendersAlike(self.player, cached)
+
+
+if __name__ == "__main__":
+    unittest.main()